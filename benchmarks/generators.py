@@ -0,0 +1,188 @@
+import os
+from PIL import Image
+
+# Synthetic decks for the benchmarks. Every generator returns the Markdown
+# for a deck with the given number of slides. The decks only use images in
+# media_dir, which make_images fills.
+
+NUMBER_OF_IMAGES = 20
+
+
+def section(i, n):
+    # a presentation part every 20 slides
+    if i % 20 == 0:
+        return "# Part %d\n\n" % (i // 20 + 1)
+    return ""
+
+def text_deck(n, media_dir):
+    parts = []
+    for i in range(n):
+        parts.append(section(i, n))
+        parts.append("""## Text slide %d
+
+Some *emphasised* and **strong** text with `inline code` in slide %d.
+
+- first item
+- second item with *emphasis*
+  - nested item
+  - another nested item
+- third item
+
+1. one
+2. two
+3. three
+
+> a quote to end with
+
+""" % (i, i))
+    return "".join(parts)
+
+CODE = '''```python
+def fibonacci(n):
+    """Returns the n-th Fibonacci number."""
+    a, b = 0, 1
+    for i in range(n):
+        a, b = b, a + b
+    return a
+
+class Counter:
+    def __init__(self):
+        self.count = %d
+
+    def increment(self, step=1):
+        self.count += step
+        return self.count
+```
+'''
+
+def code_deck(n, media_dir):
+    parts = []
+    for i in range(n):
+        parts.append(section(i, n))
+        parts.append("## Code slide %d\n\n" % i)
+        parts.append(CODE % i)
+        parts.append("\n```\nplain text block %d\n```\n\n" % i)
+    return "".join(parts)
+
+def table_deck(n, media_dir):
+    parts = []
+    for i in range(n):
+        parts.append(section(i, n))
+        parts.append("## Table slide %d\n\n.. setstyle::\n   :column_widths: 1 2 1 1\n\n" % i)
+        parts.append("| name | description | count | total |\n|---|---|---|---|\n")
+        for row in range(8):
+            parts.append("| row %d | *item* %d of slide %d | %d | **%d** |\n" % (row, row, i, row * i, row + i))
+        parts.append("\n")
+    return "".join(parts)
+
+def paged_table_deck(n, media_dir):
+    # tables that are continued on the next slides, inside a textstyle and
+    # on slides with a background and a title box
+    parts = []
+    for i in range(n):
+        parts.append(section(i, n))
+        parts.append("""## Paged table slide %d
+
+.. slide::
+   :background: %s
+
+.. title::
+   :left: 10%%
+
+.. setstyle::
+   :table_max_rows: 3
+
+.. textstyle::
+   :font_size: 14
+
+   | name | count |
+   |---|---|
+""" % (i, os.path.join(media_dir, 'background.jpg')))
+        for row in range(8):
+            parts.append("   | row %d of slide %d | %d |\n" % (row, i, row * i))
+        parts.append("\n   Text after the table.\n\nAnd after the textstyle.\n\n")
+    return "".join(parts)
+
+def image_deck(n, media_dir):
+    parts = []
+    for i in range(n):
+        parts.append(section(i, n))
+        img = os.path.join(media_dir, 'image%d.png' % (i % NUMBER_OF_IMAGES))
+        if i % 2 == 0:
+            parts.append("## Image slide %d\n\n![picture](%s)\n\n" % (i, img))
+        else:
+            parts.append("""## Image slide %d
+
+.. slide::
+   :layout: Title Only
+   :background: %s
+
+.. img:: %s
+   :left: 1in
+   :top: 2in
+   :width: 3in
+
+""" % (i, os.path.join(media_dir, 'background.jpg'), img))
+    return "".join(parts)
+
+def box_deck(n, media_dir):
+    parts = []
+    for i in range(n):
+        parts.append(section(i, n))
+        parts.append("""## Box slide %d
+
+.. slide::
+   :layout: Title Only
+
+.. title::
+   :left: 10%%
+   :bg_color: #203040
+
+.. box::
+   :left: 1in
+   :top: 2in
+   :width: 3in
+   :height: 2in
+   :bg_color: #00ff00
+   :bg_alpha: 0.5
+
+   .. textstyle::
+      :font_size: 20
+      :color: #112233
+
+      Box text *number* %d.
+
+.. box::
+   :left: 5in
+   :top: 2in
+   :width: 3in
+   :height: 2in
+
+   .. setstyle::
+      :color: #445566
+
+   - left
+   - right
+
+""" % (i, i))
+    return "".join(parts)
+
+WORKLOADS = {
+    'text': text_deck,
+    'code': code_deck,
+    'table': table_deck,
+    'paged_table': paged_table_deck,
+    'image': image_deck,
+    'box': box_deck,
+}
+
+def make_images(media_dir):
+    os.makedirs(media_dir, exist_ok=True)
+    for i in range(NUMBER_OF_IMAGES):
+        fn = os.path.join(media_dir, 'image%d.png' % i)
+        if not os.path.exists(fn):
+            img = Image.new('RGB', (800, 600), ((i * 37) % 256, (i * 91) % 256, (i * 53) % 256))
+            img.save(fn)
+    fn = os.path.join(media_dir, 'background.jpg')
+    if not os.path.exists(fn):
+        Image.new('RGB', (1600, 1200), (240, 240, 250)).save(fn, quality=90)
@@ -0,0 +1,68 @@
+import os
+import sys
+import zipfile
+import argparse
+import subprocess
+from .generators import WORKLOADS, make_images
+from .template import make_template
+
+# Checks that a build with --jobs gives the same presentation as a serial
+# build: every generated deck is built both ways and the parts of the two
+# presentations are compared.
+#
+#   python -m benchmarks.parallel [--size 40] [--jobs 2]
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def build(md_fn, out_fn, template, args):
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join([REPO] + [ p for p in [env.get('PYTHONPATH')] if p ])
+    with open(md_fn) as f:
+        subprocess.run([sys.executable, '-c', 'from slibu.cli import build; build()',
+                '-o', out_fn, '-t', template] + args, stdin=f, env=env, check=True)
+
+def different_parts(fn1, fn2):
+    # names of the parts that are missing from one file or differ
+    with zipfile.ZipFile(fn1) as z1, zipfile.ZipFile(fn2) as z2:
+        names = set(z1.namelist()) | set(z2.namelist())
+        return sorted(name for name in names
+                if name not in z1.namelist() or name not in z2.namelist()
+                or z1.read(name) != z2.read(name))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.parallel', description='Compare parallel and serial slibu builds.')
+    parser.add_argument('--workloads', default=','.join(WORKLOADS), help='comma separated workloads (default all)')
+    parser.add_argument('--size', type=int, default=40, help='number of slides per deck (default 40)')
+    parser.add_argument('--jobs', type=int, default=2, help='worker processes for the parallel build (default 2)')
+    parser.add_argument('--work-dir', default='bench_work', help='directory for generated decks and output (default bench_work)')
+    args = parser.parse_args(argv)
+
+    work_dir = os.path.abspath(args.work_dir)
+    os.makedirs(work_dir, exist_ok=True)
+    template = os.path.join(work_dir, 'template.pptx')
+    make_template(template)
+    media_dir = os.path.join(work_dir, 'media')
+    make_images(media_dir)
+
+    failed = []
+    for workload in args.workloads.split(','):
+        md_fn = os.path.join(work_dir, 'parallel-%s.md' % workload)
+        with open(md_fn, 'w') as f:
+            f.write(WORKLOADS[workload](args.size, media_dir))
+        serial_fn = os.path.join(work_dir, 'parallel-%s-serial.pptx' % workload)
+        jobs_fn = os.path.join(work_dir, 'parallel-%s-jobs.pptx' % workload)
+        build(md_fn, serial_fn, template, [])
+        build(md_fn, jobs_fn, template, ['-j', str(args.jobs)])
+        parts = different_parts(serial_fn, jobs_fn)
+        print('%-12s %s' % (workload, 'differs in ' + ', '.join(parts) if parts else 'same'))
+        if parts:
+            failed.append(workload)
+
+    for workload in failed:
+        print('FAILED:', workload)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,123 @@
+import os
+import sys
+import json
+import time
+import argparse
+from .generators import WORKLOADS, make_images
+from .template import make_template
+
+# Runs the benchmarks: builds every generated deck with the slibu command
+# line in a separate process and records wall time, peak RSS and the size of
+# the output. Results are compared with the stored baselines.
+#
+#   python -m benchmarks.run --sizes 10,100
+#   python -m benchmarks.run --update       (store the results as baselines)
+
+SIZES = [10, 100, 1000, 10000]
+BASELINES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines.json')
+
+# allowed increase over the baseline, as a fraction
+TOLERANCES = {
+    'seconds': 0.25,
+    'max_rss_kb': 0.20,
+    'size': 0.05,
+}
+
+
+def run_slibu(args, stdin_fn):
+    # wait4 gives the resource usage of this child only
+    fd = os.open(stdin_fn, os.O_RDONLY)
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    env = dict(os.environ)
+    repo = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env['PYTHONPATH'] = os.pathsep.join([repo] + [ p for p in [env.get('PYTHONPATH')] if p ])
+    argv = [sys.executable, '-c', 'from slibu.cli import build; build()'] + args
+    start = time.perf_counter()
+    try:
+        pid = os.posix_spawn(sys.executable, argv, env, file_actions=[
+            (os.POSIX_SPAWN_DUP2, fd, 0),
+            (os.POSIX_SPAWN_DUP2, devnull, 1),
+        ])
+        _, status, rusage = os.wait4(pid, 0)
+    finally:
+        os.close(fd)
+        os.close(devnull)
+    seconds = time.perf_counter() - start
+    return os.waitstatus_to_exitcode(status), seconds, rusage.ru_maxrss
+
+def run_benchmark(workload, n, work_dir, slibu_args):
+    media_dir = os.path.join(work_dir, 'media')
+    md_fn = os.path.join(work_dir, '%s-%d.md' % (workload, n))
+    out_fn = os.path.join(work_dir, '%s-%d.pptx' % (workload, n))
+    with open(md_fn, 'w') as f:
+        f.write(WORKLOADS[workload](n, media_dir))
+    if os.path.exists(out_fn):
+        os.remove(out_fn)
+    args = ['-o', out_fn, '-t', os.path.join(work_dir, 'template.pptx')] + slibu_args
+    status, seconds, max_rss_kb = run_slibu(args, md_fn)
+    if status != 0:
+        raise RuntimeError('slibu failed on %s (exit status %d)' % (md_fn, status))
+    return {
+        'seconds': round(seconds, 3),
+        'max_rss_kb': max_rss_kb,
+        'size': os.path.getsize(out_fn),
+    }
+
+def check(result, baseline):
+    # returns the regressions of result against baseline
+    regressions = []
+    for key, tolerance in TOLERANCES.items():
+        if key in baseline and result[key] > baseline[key] * (1 + tolerance):
+            regressions.append('%s %s > %s' % (key, result[key], baseline[key]))
+    return regressions
+
+def load_baselines(fn):
+    try:
+        with open(fn) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.run', description='Run the slibu benchmarks.')
+    parser.add_argument('--workloads', default=','.join(WORKLOADS), help='comma separated workloads (default all)')
+    parser.add_argument('--sizes', default=','.join(map(str, SIZES)), help='comma separated slide counts (default all)')
+    parser.add_argument('--work-dir', default='bench_work', help='directory for generated decks and output (default bench_work)')
+    parser.add_argument('--baselines', default=BASELINES, help='baselines file')
+    parser.add_argument('--update', action='store_true', help='store the results as the new baselines')
+    parser.add_argument('--slibu-args', default='', help='extra arguments for slibu, e.g. "-j 4"')
+    args = parser.parse_args(argv)
+
+    work_dir = os.path.abspath(args.work_dir)
+    os.makedirs(work_dir, exist_ok=True)
+    make_template(os.path.join(work_dir, 'template.pptx'))
+    make_images(os.path.join(work_dir, 'media'))
+    baselines = load_baselines(args.baselines)
+
+    failed = False
+    for workload in args.workloads.split(','):
+        for n in map(int, args.sizes.split(',')):
+            name = '%s/%d' % (workload, n)
+            result = run_benchmark(workload, n, work_dir, args.slibu_args.split())
+            baseline = baselines.get(name)
+            if args.update:
+                baselines[name] = result
+                verdict = 'stored'
+            elif baseline is None:
+                verdict = 'no baseline'
+            else:
+                regressions = check(result, baseline)
+                verdict = 'REGRESSION: ' + ', '.join(regressions) if regressions else 'ok'
+                failed = failed or bool(regressions)
+            print('%-12s %9.3fs %9d KiB %10d bytes  %s' % (name,
+                result['seconds'], result['max_rss_kb'], result['size'], verdict))
+
+    if args.update:
+        with open(args.baselines, 'w') as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+            f.write('\n')
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
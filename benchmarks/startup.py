@@ -0,0 +1,90 @@
+import os
+import sys
+import json
+import argparse
+import subprocess
+import statistics
+from .template import make_template
+
+# Checks the startup cost of the slibu command line:
+#
+# - importing slibu.cli must stay within the import time budget and must not
+#   load python-pptx, mistune, lxml, PIL or Pygments
+# - building a deck without code blocks must not load Pygments
+#
+#   python -m benchmarks.startup [--budget-ms 150]
+
+IMPORT_BUDGET_MS = 150
+
+# modules that slibu.cli must not import
+HEAVY_MODULES = [ 'pptx', 'mistune', 'lxml', 'PIL', 'pygments' ]
+
+TINY_DECK = """# Status
+
+## This week
+
+All *good*.
+
+- first
+- second
+"""
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def python(code, stdin=None, args=[]):
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join([REPO] + [ p for p in [env.get('PYTHONPATH')] if p ])
+    return subprocess.run([sys.executable] + args + ['-c', code], input=stdin,
+            env=env, capture_output=True, text=True, check=True)
+
+def import_time_ms():
+    # cumulative import time of slibu.cli, as reported by -X importtime
+    stderr = python('import slibu.cli', args=['-X', 'importtime']).stderr
+    for line in stderr.splitlines():
+        fields = line.split('|')
+        if len(fields) == 3 and fields[2].strip() == 'slibu.cli':
+            return int(fields[1]) / 1000
+    raise RuntimeError('slibu.cli not found in import times')
+
+def loaded_modules(code, stdin=None):
+    # top level packages of the modules that are loaded after running code
+    code += '\nimport sys, json\nprint(json.dumps(sorted(set(m.split(".")[0] for m in sys.modules))))'
+    return set(json.loads(python(code, stdin).stdout.splitlines()[-1]))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.startup', description='Check the startup cost of slibu.')
+    parser.add_argument('--budget-ms', type=float, default=IMPORT_BUDGET_MS, help='import time budget for slibu.cli (default %d)' % IMPORT_BUDGET_MS)
+    parser.add_argument('--runs', type=int, default=5, help='number of measurements, the median counts (default 5)')
+    parser.add_argument('--work-dir', default='bench_work', help='directory for the template and output (default bench_work)')
+    args = parser.parse_args(argv)
+
+    failed = []
+    ms = statistics.median(import_time_ms() for i in range(args.runs))
+    print('import slibu.cli: %.1f ms (budget %.1f ms)' % (ms, args.budget_ms))
+    if ms > args.budget_ms:
+        failed.append('import time over budget')
+
+    heavy = loaded_modules('import slibu.cli') & set(HEAVY_MODULES)
+    print('heavy modules loaded by import slibu.cli: %s' % (', '.join(sorted(heavy)) or 'none'))
+    if heavy:
+        failed.append('slibu.cli imports %s' % ', '.join(sorted(heavy)))
+
+    work_dir = os.path.abspath(args.work_dir)
+    os.makedirs(work_dir, exist_ok=True)
+    template = os.path.join(work_dir, 'template.pptx')
+    make_template(template)
+    out = os.path.join(work_dir, 'startup.pptx')
+    build = 'import sys\nfrom slibu.cli import build\nbuild(%r, standalone_mode=False)' % (['-t', template, '-o', out],)
+    modules = loaded_modules(build, TINY_DECK)
+    print('Pygments loaded for a deck without code: %s' % ('pygments' in modules))
+    if 'pygments' in modules:
+        failed.append('Pygments is imported for a deck without code blocks')
+
+    for f in failed:
+        print('FAILED:', f)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
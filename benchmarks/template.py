@@ -0,0 +1,11 @@
+import pptx
+
+# The benchmarks use python-pptx's default template, with the layout names
+# that slibu expects, so that no binary template has to be kept in the repo.
+
+def make_template(fn):
+    prs = pptx.Presentation()
+    for layout in prs.slide_layouts:
+        if layout.name == 'Section Header':
+            layout._element.cSld.name = '1_Section Header'
+    prs.save(fn)
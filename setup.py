@@ -13,6 +13,9 @@ setup(
         'Pygments',
         'python-pptx',
     ],
+    extras_require={
+        'parquet': ['pyarrow'],
+    },
     entry_points='''
         [console_scripts]
         slibu=slibu.cli:build
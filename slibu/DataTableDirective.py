@@ -0,0 +1,47 @@
+from mistune.directives.base import Directive
+from collections import OrderedDict
+from .directive_util import parse_string, parse_int, parse_string_list
+
+# .. table:: data.csv
+#
+# The data file is only read when the table is rendered, its rows never
+# become Markdown or AST. The AST type is data_table, because table is the
+# type of Markdown pipe tables.
+
+class DataTableDirective(Directive):
+
+    parsers = {
+            'columns': parse_string_list,
+            'sort': parse_string,
+            'top': parse_int,
+            'number_format': parse_string,
+            'delimiter': parse_string,
+    }
+
+    def parse(self, block, m, state):
+        src = m.group('value').strip()
+        options = self.parse_options(m)
+        d = OrderedDict()
+        for k,v in options:
+            try:
+                d[k] = self.parsers[k](v)
+            except KeyError:
+                pass
+
+        return {
+            'type': 'data_table',
+            'raw': None,
+            'params': [src] + list(d.items()),
+        }
+
+    def __call__(self, md):
+        self.register_directive(md, 'table')
+        md.renderer.register('data_table', render_ast_data_table)
+
+
+def render_ast_data_table(children, src, *options):
+    return {
+        'type': 'data_table',
+        'src': src,
+        'options': dict(options),
+    }
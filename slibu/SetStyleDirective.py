@@ -1,6 +1,6 @@
 from mistune.directives.base import Directive
 from collections import OrderedDict
-from .directive_util import parse_length, parse_color, parse_font_size, parse_string, parse_int_list
+from .directive_util import parse_length, parse_color, parse_font_size, parse_string, parse_int_list, parse_int, parse_bool
 
 class SetStyleDirective(Directive):
 
@@ -9,6 +9,8 @@ class SetStyleDirective(Directive):
             'color': parse_color,
             'font_name': parse_string,
             'column_widths': parse_int_list,
+            'table_max_rows': parse_int,
+            'table_fit': parse_bool,
     }
 
 
@@ -0,0 +1,11 @@
+# render and Template are imported on first use, so that importing slibu.cli
+# for --help does not load python-pptx
+
+def __getattr__(name):
+    if name == 'render':
+        from .api import render
+        return render
+    if name == 'Template':
+        from .template import Template
+        return Template
+    raise AttributeError("module 'slibu' has no attribute %r" % name)
@@ -0,0 +1,53 @@
+import io
+import threading
+from .builder import Builder, create_markdown
+from .template import Template
+
+# Python API for programs that build presentations in the same process,
+# such as a rendering service. Templates are read once and copied for every
+# build, every thread has its own Markdown parser and every build its own
+# presentation, so render can be called from several threads at once.
+
+_templates = {}
+_templates_lock = threading.Lock()
+_local = threading.local()
+
+
+def get_template(template):
+    # returns a Template for a path, reading it again if the file changed
+    if isinstance(template, Template):
+        return template
+    with _templates_lock:
+        t = _templates.get(template)
+        if t is None or t.is_changed():
+            t = _templates[template] = Template(template)
+        return t
+
+def get_markdown():
+    markdown = getattr(_local, 'markdown', None)
+    if markdown is None:
+        markdown = _local.markdown = create_markdown()
+    return markdown
+
+def render(markdown, template='reference.pptx', out_file=None, options=None, save_options=None, cache=None):
+    """Builds a presentation from markdown, which is a string or an iterable
+    of lines. Lines are parsed and rendered one slide at a time, as with
+    --stream. template is a path or a Template. The presentation is written
+    to out_file, a file name or a writable binary stream; without out_file
+    it is returned as bytes.
+
+    options are keyword arguments for PPTXWriter, such as resampler or
+    code_cache, save_options are keyword arguments for
+    PPTXPresentation.save and cache is a SlideCache to share between
+    builds."""
+    builder = Builder(get_template(template), cache, markdown=get_markdown(),
+            options=options, save_options=save_options)
+    out = out_file
+    if out_file is None:
+        out = io.BytesIO()
+    if isinstance(markdown, str):
+        builder.build(markdown, out)
+    else:
+        builder.build_stream(markdown, out)
+    if out_file is None:
+        return out.getvalue()
@@ -0,0 +1,69 @@
+import json
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from .builder import Builder, create_markdown
+from .slide_cache import SlideCache
+from .template import Template
+
+# Builds many decks in one process, or in a pool of worker processes.
+# Every process keeps one Markdown parser and one Builder per template,
+# so templates are only read and parsed once per process.
+
+_markdown = None
+_builders = {}
+_cache_dir = None
+_options = {}
+_save_options = {}
+
+
+def read_manifest(path):
+    # The manifest is a JSON list of objects with the keys markdown,
+    # template (optional, default reference.pptx) and out_file.
+    with open(path) as f:
+        jobs = json.load(f)
+    return [ (j['markdown'], j.get('template', 'reference.pptx'), j['out_file']) for j in jobs ]
+
+def _init_worker(cache_dir, options, save_options):
+    global _cache_dir, _options, _save_options
+    _cache_dir = cache_dir
+    _options = options
+    _save_options = save_options
+
+def get_builder(template_path):
+    global _markdown
+    if _markdown is None:
+        _markdown = create_markdown()
+    builder = _builders.get(template_path)
+    if builder is None:
+        template = Template(template_path)
+        cache = None
+        if _cache_dir is not None:
+            cache = SlideCache(_cache_dir, template, _options)
+        builder = Builder(template, cache, markdown=_markdown, options=_options,
+                save_options=_save_options)
+        _builders[template_path] = builder
+    return builder
+
+def run_job(job):
+    # returns the output file and the error message, or None on success
+    markdown, template, out_file = job
+    try:
+        with open(markdown) as f:
+            get_builder(template).build(f.read(), out_file)
+        return out_file, None
+    except Exception:
+        return out_file, traceback.format_exc()
+
+def build_batch(jobs, workers=1, cache_dir=None, options=None, save_options=None):
+    # jobs is a list of (markdown, template, out_file) tuples, options are
+    # keyword arguments for PPTXWriter and save_options for
+    # PPTXPresentation.save
+    if options is None:
+        options = {}
+    if save_options is None:
+        save_options = {}
+    if workers <= 1:
+        _init_worker(cache_dir, options, save_options)
+        return [ run_job(job) for job in jobs ]
+    with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(cache_dir, options, save_options)) as pool:
+        return list(pool.map(run_job, jobs))
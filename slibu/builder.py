@@ -0,0 +1,97 @@
+import contextlib
+import mistune
+from .ImageDirective import ImageDirective
+from .BoxDirective import BoxDirective
+from .TitleDirective import TitleDirective
+from .SlideDirective import SlideDirective
+from .TextStyleDirective import TextStyleDirective
+from .SetStyleDirective import SetStyleDirective
+from .DataTableDirective import DataTableDirective
+from .pptx_writer import PPTXWriter
+from .parallel import feed_parallel
+from .chunking import split_slides, split_markdown
+from .profiler import Profiler
+
+
+def create_markdown():
+    return mistune.create_markdown(renderer=mistune.AstRenderer(),
+            plugins=['table', ImageDirective(), BoxDirective(),
+            TitleDirective(), TextStyleDirective(), SetStyleDirective(),
+            SlideDirective(), DataTableDirective()])
+
+
+class Builder:
+    """Builds presentations from Markdown. The template, the Markdown
+    parser and the slide cache are kept between builds."""
+
+    def __init__(self, template, cache=None, jobs=1, markdown=None, options=None, profile=False, save_options=None):
+        self.template = template
+        self.cache = cache
+        self.jobs = jobs
+        # keyword arguments for PPTXWriter
+        if options is None:
+            options = {}
+        self.options = options
+        # keyword arguments for PPTXPresentation.save
+        if save_options is None:
+            save_options = {}
+        self.save_options = save_options
+        if markdown is None:
+            markdown = create_markdown()
+        self.markdown = markdown
+        self.stats = {}
+        # a new Profiler per build if profile is set
+        self.profile = profile
+        self.profiler = None
+
+    def phase(self, name):
+        if self.profiler is None:
+            return contextlib.nullcontext()
+        return self.profiler.phase(name)
+
+    def parse(self, text):
+        with self.phase('parse'):
+            return self.markdown(text)
+
+    def render(self, chunks):
+        # chunks is an iterable of per-slide AST chunks
+        with self.phase('render'):
+            writer = PPTXWriter(self.template, profiler=self.profiler, **self.options)
+            if self.jobs > 1:
+                # slides rendered by workers are not profiled
+                feed_parallel(writer, chunks, self.jobs, self.cache)
+            else:
+                writer.feed_chunks(chunks, self.cache)
+        return writer
+
+    def start_profile(self):
+        if self.profile:
+            self.profiler = Profiler()
+
+    def build(self, text, out_file):
+        self.start_profile()
+        ast = self.parse(text)
+        self.save(self.render(split_slides(ast)), out_file)
+        return ast
+
+    def build_stream(self, lines, out_file):
+        # Parses and renders the Markdown one slide at a time, so that only
+        # the text and AST of the current slide are kept in memory.
+        self.start_profile()
+        chunks = ( chunk for text in split_markdown(lines)
+                for chunk in split_slides(self.parse(text)) )
+        self.save(self.render(chunks), out_file)
+
+    def save(self, writer, out_file):
+        with self.phase('save'):
+            # out_file is a file name or a writable binary stream
+            writer.save(out_file, **self.save_options)
+        self.stats = {
+            'runs merged': writer.presentation.runs_saved,
+            'code cache hits': writer.code_cache.hits,
+            'code cache misses': writer.code_cache.misses,
+        }
+        if self.cache is not None:
+            self.cache.save()
+            self.stats['slide cache hits'] = self.cache.hits
+            self.stats['slide cache misses'] = self.cache.misses
@@ -0,0 +1,69 @@
+import os
+import threading
+import hashlib
+from collections import OrderedDict
+
+# Helpers shared by the caches.
+
+
+def write_atomic(path, data):
+    # Readers in other processes and threads see either the old file or the
+    # whole new one.
+    tmp = '%s.%d.%d.tmp' % (path, os.getpid(), threading.get_ident())
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+def file_digest(path):
+    # sha1 of a file, read in blocks
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 16), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+class LRUCache:
+    """Keeps entries in memory until their sizes add up to more than
+    max_size, then forgets the least recently used ones. size is a function
+    that gives the size of a value; without it every value has size 1."""
+
+    def __init__(self, max_size, size=None):
+        self.max_size = max_size
+        self.size = size
+        self.entries = OrderedDict()
+        self.total = 0
+        self.lock = threading.Lock()
+
+    def __getstate__(self):
+        # worker processes start with an empty cache
+        return { 'max_size': self.max_size, 'size': self.size }
+
+    def __setstate__(self, state):
+        self.__init__(state['max_size'], state['size'])
+
+    def __len__(self):
+        return len(self.entries)
+
+    def size_of(self, value):
+        if self.size is None:
+            return 1
+        return self.size(value)
+
+    def get(self, key):
+        with self.lock:
+            value = self.entries.get(key)
+            if value is not None:
+                self.entries.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.total -= self.size_of(old)
+            self.entries[key] = value
+            self.total += self.size_of(value)
+            while self.total > self.max_size and len(self.entries) > 1:
+                key, old = self.entries.popitem(last=False)
+                self.total -= self.size_of(old)
@@ -0,0 +1,235 @@
+import os
+import re
+from PIL import Image
+from pptx import Presentation
+from .builder import create_markdown
+from .chunking import split_markdown, FENCE
+from .template import Template
+from .data_source import read_rows
+from .pptx_writer import PPTXWriter, inline_runs
+from .presentation import index_layouts
+from .ImageDirective import ImageDirective
+from .BoxDirective import BoxDirective
+from .TitleDirective import TitleDirective
+from .SlideDirective import SlideDirective
+from .TextStyleDirective import TextStyleDirective
+from .SetStyleDirective import SetStyleDirective
+from .DataTableDirective import DataTableDirective
+
+# Checks a deck without building it: directives and their options, layouts,
+# images, data files and code block languages are checked line by line
+# against the template's layouts; then every slide is parsed and its syntax
+# tree is checked for elements that PPTXWriter cannot render. Images are
+# only opened to read their header, they are not hashed like in a build.
+
+DIRECTIVES = {
+    'img': ImageDirective.parsers,
+    'box': BoxDirective.parsers,
+    'title': TitleDirective.parsers,
+    'slide': SlideDirective.parsers,
+    'textstyle': TextStyleDirective.parsers,
+    'setstyle': SetStyleDirective.parsers,
+    'table': DataTableDirective.parsers,
+}
+
+# layouts used by PPTXWriter.handle_heading
+HEADING_LAYOUTS = { 1: '1_Section Header', 2: 'Title and Content' }
+
+DIRECTIVE = re.compile(r'^( *)\.\. +([a-zA-Z0-9_-]+)::(?: +(.*))?$')
+OPTION = re.compile(r'^ +:([a-zA-Z0-9_-]+): *(.*)$')
+HEADING = re.compile(r'^ {0,3}(#{1,6})(?:\s|$)')
+IMAGE = re.compile(r'!\[[^\]]*\]\(\s*<?([^)\s>]+)')
+
+# elements that render as content of the content placeholder
+CONTENT_TYPES = [ 'paragraph', 'list', 'block_code', 'table', 'data_table', 'linebreak' ]
+
+# elements that contain content elements, but are no content themselves
+WRAPPER_TYPES = [ 'textstyle', 'block_quote' ]
+
+# elements that are rendered by the handler of their parent, or that are
+# harmless to skip
+IGNORED_TYPES = [ 'table_head', 'table_body', 'table_row', 'table_cell', 'newline' ]
+
+
+def read_layouts(template):
+    # layout name -> True if the layout has a content placeholder
+    if isinstance(template, Template):
+        prs = template.open()
+    else:
+        prs = Presentation(template)
+    return { name: position is not None for name, (layout, position) in index_layouts(prs).items() }
+
+
+class Checker:
+    """Collects the problems of a deck as (line number, message) pairs."""
+
+    def __init__(self, template):
+        self.layouts = read_layouts(template)
+        self.problems = []
+        self.checked_files = {}
+
+    def problem(self, line, message):
+        self.problems.append((line, message))
+
+    def check(self, text):
+        lines = text.splitlines()
+        self.scan(lines)
+        self.check_slides(lines)
+        self.problems.sort(key=lambda p: p[0])
+        return self.problems
+
+    # line by line checks
+
+    def scan(self, lines):
+        fence = None
+        directive = None
+        for n, line in enumerate(lines, 1):
+            m = FENCE.match(line)
+            if fence is not None:
+                if m and m.group(1)[0] == fence[0] and len(m.group(1)) >= len(fence) \
+                        and line.strip() == m.group(1):
+                    fence = None
+                continue
+            if m:
+                fence = m.group(1)
+                self.check_language(n, line[m.end():].strip())
+                directive = None
+                continue
+            m = OPTION.match(line)
+            if directive is not None and m:
+                self.check_option(n, directive, m.group(1), m.group(2).strip())
+                continue
+            directive = None
+            m = DIRECTIVE.match(line)
+            if m:
+                directive = self.check_directive(n, m.group(2), (m.group(3) or '').strip())
+                continue
+            m = HEADING.match(line)
+            if m:
+                self.check_layout(n, HEADING_LAYOUTS.get(len(m.group(1))))
+            for src in IMAGE.findall(line):
+                self.check_image(n, src)
+
+    def check_directive(self, n, name, value):
+        # returns the name of the directive if its options should be checked
+        if name not in DIRECTIVES:
+            self.problem(n, "unknown directive %s, the directives are %s" % (name, ", ".join(sorted(DIRECTIVES))))
+            return None
+        if name == 'img':
+            self.check_image(n, value)
+        elif name == 'table':
+            self.check_data_file(n, value)
+        return name
+
+    def check_option(self, n, directive, key, value):
+        parser = DIRECTIVES[directive].get(key)
+        if parser is None:
+            self.problem(n, "unknown option %s for %s, the options are %s" % (key, directive, ", ".join(sorted(DIRECTIVES[directive]))))
+            return
+        try:
+            valid = parser(value) is not None
+        except (ValueError, TypeError):
+            valid = False
+        if not valid:
+            self.problem(n, "invalid value %r for option %s of %s" % (value, key, directive))
+        elif directive == 'slide' and key == 'layout':
+            self.check_layout(n, value)
+        elif directive == 'slide' and key == 'background':
+            self.check_image(n, value)
+
+    def check_layout(self, n, name):
+        if name is not None and name not in self.layouts:
+            self.problem(n, "layout %r is not in the template, the layouts are %s" % (name, ", ".join(self.layouts)))
+
+    def check_image(self, n, src):
+        if src == '':
+            self.problem(n, "image without a file name")
+            return
+        error = self.checked_files.get(src)
+        if error is None:
+            if not os.path.isfile(src):
+                error = "image %s not found" % src
+            else:
+                try:
+                    # PIL reads the header until the pixels are accessed
+                    with Image.open(src):
+                        pass
+                    error = ''
+                except Exception:
+                    error = "%s is not an image that can be read" % src
+            self.checked_files[src] = error
+        if error:
+            self.problem(n, error)
+
+    def check_data_file(self, n, src):
+        if not os.path.isfile(src):
+            self.problem(n, "data file %s not found" % src)
+
+    def check_language(self, n, info):
+        if info == '':
+            return
+        from pygments.lexers import get_lexer_by_name
+        from pygments.util import ClassNotFound
+        try:
+            get_lexer_by_name(info)
+        except ClassNotFound:
+            self.problem(n, "unknown code block language %s" % info)
+
+    # checks on the syntax tree of every slide
+
+    def check_slides(self, lines):
+        # problems are reported at the first line of the slide, as the
+        # syntax tree has no line numbers
+        markdown = create_markdown()
+        n = 1
+        for text in split_markdown(line + '\n' for line in lines):
+            ast = markdown(text)
+            self.slide_layout = None
+            self.check_elements(n, ast, True)
+            n += text.count('\n')
+
+    def check_elements(self, n, ast, top):
+        # top is True for elements that are rendered in the content
+        # placeholder of the slide
+        for e in ast:
+            t = e['type']
+            if t == 'heading':
+                self.slide_layout = HEADING_LAYOUTS.get(e['level'], self.slide_layout)
+            elif t == 'slide' and e['options'].get('layout') is not None:
+                self.slide_layout = e['options']['layout']
+            elif t == 'block_error':
+                if not e['children'].startswith('Unsupported directive'):
+                    self.problem(n, e['children'])
+                continue
+            elif t == 'data_table':
+                self.check_data_columns(n, e)
+            if t in CONTENT_TYPES and top and self.slide_layout is not None \
+                    and self.layouts.get(self.slide_layout) is False:
+                self.problem(n, "this slide has a %s that is not shown, layout %r has no content placeholder"
+                        % (t.replace('_', ' '), self.slide_layout))
+            if t not in PPTXWriter.handlers and t not in inline_runs and t not in IGNORED_TYPES:
+                self.problem(n, "this slide has a %s, which is not supported" % t.replace('_', ' '))
+            children = e.get('children')
+            if isinstance(children, list):
+                self.check_elements(n, children, top and t in WRAPPER_TYPES)
+
+    def check_data_columns(self, n, e):
+        src = e['src']
+        if not os.path.isfile(src):
+            return
+        try:
+            header, rows = read_rows(src, e['options'].get('delimiter'))
+        except Exception:
+            return
+        columns = e['options'].get('columns') or header
+        for c in columns:
+            if c not in header:
+                self.problem(n, "column %s is not in %s, the columns are %s" % (c, src, ", ".join(header)))
+        sort = e['options'].get('sort')
+        if sort is not None and sort.lstrip('-+') not in columns:
+            self.problem(n, "cannot sort %s on column %s, it is not shown" % (src, sort.lstrip('-+')))
+
+
+def check(text, template):
+    # returns the problems of the Markdown text as (line number, message)
+    return Checker(template).check(text)
@@ -0,0 +1,68 @@
+import re
+
+# Helpers to cut a document into per-slide pieces.
+
+def is_slide_start(e):
+    # level 1 and level 2 headings start a new slide, see
+    # PPTXWriter.handle_heading
+    return e['type'] == 'heading' and e['level'] in (1, 2)
+
+def split_slides(ast):
+    # yields lists of AST elements, each starting with a slide heading.
+    # The first chunk contains everything before the first slide heading
+    # and can be empty.
+    chunk = []
+    for e in ast:
+        if is_slide_start(e):
+            yield chunk
+            chunk = [e]
+        else:
+            chunk.append(e)
+    yield chunk
+
+def collect_media(ast):
+    # returns the paths of all media files referenced in ast
+    media = []
+    for e in ast:
+        if e['type'] in ['img', 'image']:
+            media.append(e['src'])
+        elif e['type'] == 'slide':
+            background = e['options'].get('background')
+            if background is not None:
+                media.append(background)
+        media.extend(collect_media(e.get('children') or []))
+    return media
+
+def collect_data_files(ast):
+    # returns the paths of the data files of table directives in ast
+    files = []
+    for e in ast:
+        if e['type'] == 'data_table':
+            files.append(e['src'])
+        files.extend(collect_data_files(e.get('children') or []))
+    return files
+
+SLIDE_HEADING = re.compile(r' {0,3}#{1,2}(\s|$)')
+FENCE = re.compile(r' {0,3}(`{3,}|~{3,})')
+
+def split_markdown(lines):
+    # Splits Markdown text, given as an iterable of lines, before every
+    # level 1 or level 2 ATX heading outside fenced code blocks. Yields the
+    # text of each part as soon as the next heading has been read.
+    # Setext headings and link references across parts are not supported.
+    chunk = []
+    fence = None
+    for line in lines:
+        m = FENCE.match(line)
+        if fence is None:
+            if m:
+                fence = m.group(1)
+            elif SLIDE_HEADING.match(line) and chunk != []:
+                yield ''.join(chunk)
+                chunk = []
+        elif m and m.group(1)[0] == fence[0] and len(m.group(1)) >= len(fence) \
+                and line.strip() == m.group(1):
+            fence = None
+        chunk.append(line)
+    if chunk != []:
+        yield ''.join(chunk)
@@ -2,30 +2,167 @@
 
 # SliBu, the slide builder
 
+import os
 import sys
 import click
-import mistune
-from mistune import AstRenderer
-from .ImageDirective import ImageDirective
-from .BoxDirective import BoxDirective
-from .TitleDirective import TitleDirective
-from .SlideDirective import SlideDirective
-from .TextStyleDirective import TextStyleDirective
-from .SetStyleDirective import SetStyleDirective
-from .pptx_writer import PPTXWriter
-
-@click.command()
+from .code_cache import CodeCache
+
+# Modules that import python-pptx, mistune or PIL are imported in the
+# commands, so that --help and argument errors do not wait for them.
+
+
+def image_options(f):
+    f = click.option('--jpeg-quality', default=85, help='quality of re-encoded JPEG images (default 85)')(f)
+    f = click.option('--image-format', type=click.Choice(['keep', 'jpeg']), default='keep', help='re-encode opaque PNG, BMP and TIFF images as JPEG (default keep)')(f)
+    f = click.option('--shared-backgrounds', is_flag=True, help='put slide backgrounds in generated layouts that slides with the same background share')(f)
+    f = click.option('--image-dpi', type=int, default=None, help='downsample images to this resolution at their displayed size')(f)
+    return f
+
+def save_options(f):
+    f = click.option('--deflate-media', is_flag=True, help='also compress images and other media that are compressed already')(f)
+    f = click.option('--compress-level', type=click.IntRange(0, 9), default=None, help='deflate level for the XML parts, 0 stores them uncompressed (default 6)')(f)
+    return f
+
+def make_save_options(compress_level, deflate_media):
+    return { 'compress_level': compress_level, 'store_media': not deflate_media }
+
+def make_writer_options(cache_dir, image_dpi, image_format, jpeg_quality, shared_backgrounds=False, spill_dir=None):
+    code_dir = None
+    if cache_dir is not None:
+        code_dir = os.path.join(cache_dir, 'code')
+    options = { 'code_cache': CodeCache(code_dir) }
+    if shared_backgrounds:
+        options['shared_backgrounds'] = True
+    if spill_dir is not None:
+        options['spill_dir'] = spill_dir
+    if image_dpi is not None or image_format != 'keep':
+        resampled_dir = None
+        if cache_dir is not None:
+            resampled_dir = os.path.join(cache_dir, 'resampled')
+        from .image_resample import ImageResampler
+        options['resampler'] = ImageResampler(image_dpi, image_format, jpeg_quality, resampled_dir)
+    return options
+
+
+@click.group(invoke_without_command=True)
+@click.option('-o', '--out-file', default='out.pptx', help='write output to this file, - for stdout (default out.pptx)')
+@click.option('-t', '--template', default='reference.pptx', help='pptx file to use as slide template (default reference.pptx)')
+@click.option('--cache-dir', default=None, help='reuse unchanged slides from earlier builds stored in this directory')
+@click.option('-j', '--jobs', default=1, help='number of processes to render slides with (default 1)')
+@click.option('--stream', is_flag=True, help='parse and render the input one slide at a time')
+@click.option('--spill-dir', default=None, help='keep finished slides and images in files in this directory instead of in memory')
+@click.option('--stats', is_flag=True, help='print build statistics to stderr')
+@click.option('--check', is_flag=True, help='only check the input for problems, do not build')
+@click.option('--profile', is_flag=True, help='print where the build time goes to stderr')
+@click.option('--profile-json', default=None, help='write the profile as JSON to this file')
+@image_options
+@save_options
+@click.pass_context
+def build(ctx, out_file, template, cache_dir, jobs, stream, spill_dir, stats, check, profile, profile_json, image_dpi, image_format, jpeg_quality, shared_backgrounds, compress_level, deflate_media):
+    if ctx.invoked_subcommand is not None:
+        return
+    if check:
+        from .check import check as check_deck
+        problems = check_deck(sys.stdin.read(), template)
+        for line, message in problems:
+            print("<stdin>:%d: %s" % (line, message))
+        if problems:
+            sys.exit(1)
+        return
+    from .builder import Builder
+    from .slide_cache import SlideCache
+
+    options = make_writer_options(cache_dir, image_dpi, image_format, jpeg_quality, shared_backgrounds, spill_dir)
+    cache = None
+    if cache_dir is not None:
+        cache = SlideCache(cache_dir, template, options)
+
+    builder = Builder(template, cache, jobs, options=options,
+            profile=profile or profile_json is not None,
+            save_options=make_save_options(compress_level, deflate_media))
+    if out_file == '-':
+        out_file = sys.stdout.buffer
+    if stream:
+        builder.build_stream(sys.stdin, out_file)
+    else:
+        builder.build(sys.stdin.read(), out_file)
+    if stats:
+        for k, v in builder.stats.items():
+            print("%s: %s" % (k, v), file=sys.stderr)
+    if profile:
+        builder.profiler.report(sys.stderr)
+    if profile_json is not None:
+        builder.profiler.write_json(profile_json)
+
+
+@build.command()
+@click.argument('source')
 @click.option('-o', '--out-file', default='out.pptx', help='write output to this file (default out.pptx)')
 @click.option('-t', '--template', default='reference.pptx', help='pptx file to use as slide template (default reference.pptx)')
-def build(out_file, template):
+@click.option('--cache-dir', default=None, help='also keep unchanged slides in this directory')
+@click.option('-j', '--jobs', default=1, help='number of processes to render slides with (default 1)')
+@click.option('--interval', default=0.2, help='seconds between checks for changes (default 0.2)')
+@image_options
+@save_options
+def watch(source, out_file, template, cache_dir, jobs, interval, image_dpi, image_format, jpeg_quality, shared_backgrounds, compress_level, deflate_media):
+    """Rebuild whenever SOURCE or its images change."""
+    from .builder import Builder
+    from .slide_cache import SlideCache
+    from .template import Template
+    from . import watch as watcher
+    options = make_writer_options(cache_dir, image_dpi, image_format, jpeg_quality, shared_backgrounds)
+    template = Template(template)
+    builder = Builder(template, SlideCache(cache_dir, template, options), jobs, options=options,
+            save_options=make_save_options(compress_level, deflate_media))
+    try:
+        watcher.watch(builder, source, out_file, interval)
+    except KeyboardInterrupt:
+        pass
 
-    markdown = mistune.create_markdown(renderer=mistune.AstRenderer(),
-            plugins=['table', ImageDirective(), BoxDirective(),
-            TitleDirective(), TextStyleDirective(), SetStyleDirective(),
-            SlideDirective()])
 
-    r = PPTXWriter(template)
-    r.feed(markdown(sys.stdin.read()))
-    r.save(out_file)
+@build.command()
+@click.argument('manifest')
+@click.option('-w', '--workers', default=1, help='number of worker processes (default 1)')
+@click.option('--cache-dir', default=None, help='reuse unchanged slides from earlier builds stored in this directory')
+@image_options
+@save_options
+def batch(manifest, workers, cache_dir, image_dpi, image_format, jpeg_quality, shared_backgrounds, compress_level, deflate_media):
+    """Build all decks listed in the JSON file MANIFEST."""
+    from . import batch as batcher
+    options = make_writer_options(cache_dir, image_dpi, image_format, jpeg_quality, shared_backgrounds)
+    results = batcher.build_batch(batcher.read_manifest(manifest), workers, cache_dir, options,
+            make_save_options(compress_level, deflate_media))
+    failed = 0
+    for out_file, error in results:
+        if error is not None:
+            failed += 1
+            print("ERROR:", out_file, file=sys.stderr)
+            print(error, file=sys.stderr)
+    if failed:
+        sys.exit(1)
 
 
+@build.command()
+@click.option('-t', '--template', multiple=True, help='template to load, as NAME=PATH or PATH; the first is the default (default reference.pptx)')
+@click.option('--host', default='127.0.0.1', help='address to listen on (default 127.0.0.1)')
+@click.option('--port', default=8000, help='port to listen on (default 8000)')
+@click.option('-w', '--workers', default=1, help='number of worker processes (default 1)')
+@click.option('--queue-size', default=16, help='number of requests that can wait for a worker (default 16)')
+@click.option('--timeout', default=60.0, help='seconds before a request fails with 504 (default 60)')
+@click.option('--cache-dir', default=None, help='reuse unchanged slides from earlier builds stored in this directory')
+@image_options
+@save_options
+def serve(template, host, port, workers, queue_size, timeout, cache_dir, image_dpi, image_format, jpeg_quality, shared_backgrounds, compress_level, deflate_media):
+    """Render Markdown posted to /render over HTTP."""
+    from . import serve as server
+    templates = {}
+    for t in template or ['reference.pptx']:
+        name, _, path = t.rpartition('=')
+        templates[name or path] = path
+    options = make_writer_options(cache_dir, image_dpi, image_format, jpeg_quality, shared_backgrounds)
+    renderer = server.RenderServer(templates, workers, queue_size, timeout, cache_dir,
+            options, make_save_options(compress_level, deflate_media))
+    try:
+        server.serve(renderer, host, port)
+    except KeyboardInterrupt:
+        pass
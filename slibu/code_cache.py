@@ -0,0 +1,55 @@
+import os
+import json
+import hashlib
+from .cache_util import LRUCache, write_atomic
+
+# number of highlighted code blocks kept in memory
+MEMORY_ENTRIES = 10000
+
+
+class CodeCache:
+    """Stores the runs of highlighted code blocks, keyed on the lexer name,
+    the code and the Pygments style. Recently used runs are kept in memory
+    and, if cache_dir is given, all of them on disk. Runs do not depend on the text layout, it
+    is applied when they are added to the presentation."""
+
+    def __init__(self, cache_dir=None):
+        self.cache_dir = cache_dir
+        self.entries = LRUCache(MEMORY_ENTRIES)
+        self.hits = 0
+        self.misses = 0
+        if cache_dir is not None:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def __repr__(self):
+        # the cache does not change the output, keep slide cache keys stable
+        return 'CodeCache()'
+
+    def key(self, lexer_name, code, style):
+        import pygments
+        h = hashlib.sha1()
+        for part in [pygments.__version__, lexer_name, style, code]:
+            h.update(part.encode('utf-8'))
+            h.update(b'\0')
+        return h.hexdigest()
+
+    def get(self, key):
+        runs = self.entries.get(key)
+        if runs is None and self.cache_dir is not None:
+            try:
+                with open(os.path.join(self.cache_dir, key + '.json')) as f:
+                    runs = [ tuple(run) for run in json.load(f) ]
+                self.entries.put(key, runs)
+            except (OSError, ValueError):
+                pass
+        if runs is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return runs
+
+    def put(self, key, runs):
+        self.entries.put(key, runs)
+        if self.cache_dir is not None:
+            path = os.path.join(self.cache_dir, key + '.json')
+            write_atomic(path, json.dumps(runs).encode('utf-8'))
@@ -0,0 +1,130 @@
+import os
+import csv
+import heapq
+import itertools
+
+# Reads the rows of the data files of the table directive. Rows are
+# streamed from the file; only the rows that are shown are kept, or the top
+# rows when sorting with a limit.
+
+ARROW_EXTENSIONS = ['.parquet', '.arrow', '.feather', '.ipc']
+
+
+def read_rows(path, delimiter=None):
+    # returns the header and an iterator over the rows, as lists of values
+    ext = os.path.splitext(path)[1].lower()
+    if ext in ARROW_EXTENSIONS:
+        return read_arrow_rows(path, ext)
+    return read_csv_rows(path, delimiter)
+
+def read_csv_rows(path, delimiter=None):
+    if delimiter is None:
+        delimiter = '\t' if path.lower().endswith('.tsv') else ','
+    with open(path, newline='') as f:
+        header = next(csv.reader(f, delimiter=delimiter), [])
+    def rows():
+        # the file is only open while the rows are read
+        with open(path, newline='') as f:
+            reader = csv.reader(f, delimiter=delimiter)
+            next(reader, None)
+            yield from reader
+    return header, rows()
+
+def read_arrow_rows(path, ext):
+    # Parquet and Arrow files need pyarrow, which is optional
+    try:
+        import pyarrow.parquet
+        import pyarrow.ipc
+    except ImportError:
+        raise RuntimeError("pyarrow is needed to read %s" % path)
+    if ext == '.parquet':
+        data = pyarrow.parquet.ParquetFile(path)
+        header = data.schema_arrow.names
+        batches = data.iter_batches()
+    else:
+        data = pyarrow.ipc.open_file(path)
+        header = data.schema.names
+        batches = ( data.get_batch(i) for i in range(data.num_record_batches) )
+    def rows():
+        for batch in batches:
+            yield from zip(*[ column.to_pylist() for column in batch.columns ])
+    return header, rows()
+
+def to_number(value):
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return value
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        pass
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+def is_missing(value):
+    # empty CSV cells and nulls
+    return value is None or str(value).strip() == ''
+
+def sort_key(value):
+    # numbers sort before text
+    number = to_number(value)
+    if number is not None:
+        return (0, number, '')
+    return (1, 0, str(value))
+
+def format_value(value, number_format=None):
+    if value is None:
+        return ''
+    if number_format is not None:
+        number = to_number(value)
+        if number is not None:
+            try:
+                return format(number, number_format)
+            except ValueError:
+                # e.g. an integer format for a float
+                pass
+    return str(value)
+
+def column_formats(columns, number_format):
+    # number_format is a format spec for all columns, such as ",.2f", or
+    # per column: "revenue=,.2f; units=,d"
+    if number_format is None or '=' not in number_format:
+        return [ number_format ] * len(columns)
+    formats = {}
+    for part in number_format.split(';'):
+        column, _, spec = part.partition('=')
+        formats[column.strip()] = spec.strip()
+    return [ formats.get(c) for c in columns ]
+
+def select_rows(header, rows, columns=None, sort=None, top=None):
+    # Returns the header and the rows with the selected columns, sorted on
+    # the column sort (descending if it starts with -) and limited to the
+    # first top rows.
+    if columns is None:
+        columns = header
+    for c in columns:
+        if c not in header:
+            raise ValueError("unknown column %s in table, the columns are %s" % (c, ", ".join(header)))
+    idxs = [ header.index(c) for c in columns ]
+    rows = ( [ row[i] if i < len(row) else None for i in idxs ] for row in rows )
+    if sort is not None:
+        reverse = sort.startswith('-')
+        sort_column = sort.lstrip('-+')
+        if sort_column not in columns:
+            raise ValueError("cannot sort on column %s, it is not shown" % sort_column)
+        col = columns.index(sort_column)
+        # missing values come last in both directions
+        if reverse:
+            key = lambda row: (not is_missing(row[col]), sort_key(row[col]))
+        else:
+            key = lambda row: (is_missing(row[col]), sort_key(row[col]))
+        if top is not None:
+            # keeps only top rows in memory
+            select = heapq.nlargest if reverse else heapq.nsmallest
+            rows = select(top, rows, key=key)
+        else:
+            rows = sorted(rows, key=key, reverse=reverse)
+    elif top is not None:
+        rows = itertools.islice(rows, top)
+    return list(columns), rows
@@ -33,9 +33,15 @@ def parse_bool(v):
         return True
     return False
 
+def parse_int(v):
+    return int(v)
+
 def parse_float(v):
     return float(v)
 
+def parse_string_list(v):
+    return [ x.strip() for x in v.split(',') ]
+
 def parse_int_list(v):
     return [ int(x) for x in v.strip().split() ]
 
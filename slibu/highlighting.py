@@ -0,0 +1,120 @@
+# coding: utf-8
+
+from pygments import highlight
+from pygments.lexers import get_lexer_by_name
+from pygments.formatter import Formatter
+import re
+import functools
+
+# Turns code into (text, attributes) runs with Pygments. This module is only
+# imported when a code block needs highlighting, as importing Pygments
+# takes a while.
+
+@functools.lru_cache(maxsize=None)
+def get_lexer(name):
+    # lexers keep no state between highlight calls, so they can be shared
+    return get_lexer_by_name(name)
+
+BG_COLOR_ATTR = re.compile(r'^bg:#[0-9A-Za-z]{6}')
+BORDER_ATTR = re.compile(r'^border')
+BORDER_COLOR_ATTR = re.compile(r'^border:#[0-9A-Za-z]{6}')
+COLOR_ATTR = re.compile(r'^#[0-9A-Za-z]{6}')
+
+def get_font_attributes(style_def):
+    # turns a pygments style definition into add_text attributes
+    d = {
+        'italic': None,
+        'bold': None,
+        'underline': None,
+        'fontname': None,
+        'color': None,
+        'border': None,
+        'bg_color': None,
+    }
+
+    for attr in style_def.split():
+        # bold: render text as bold
+        if attr == 'bold':
+            d['bold'] = True
+        elif attr == 'nobold':
+            d['bold'] = False
+        # italic: render text italic
+        elif attr == 'italic':
+            d['italic'] = True
+        elif attr == 'noitalic':
+            d['italic'] = False
+        # underline render text underlined
+        # nounderline don’t render text underlined
+        elif attr == 'underline':
+            d['underline'] = True
+        elif attr == 'nounderline':
+            d['underline'] = False
+        # bg: transparent background
+        # bg:#000000 background color (black)
+        elif attr == 'bg:':
+            # background not supported on text run, 
+            d['bg_color'] = None
+            pass
+        elif BG_COLOR_ATTR.match(attr):
+            # pptx does not support background fill for text runs,
+            # only for complete shapes.
+            # rgb = RGBColor.from_string(attr[4:])
+            # run.font.fill.back_color.rgb = rgb
+            d['bg_color'] = attr[4:]
+        # border: no border
+        elif BORDER_ATTR.match(attr):
+            d['border'] = None
+        # border:#ffffff border color (white)
+        elif BORDER_COLOR_ATTR.match(attr):
+            d['border'] = attr[8:]
+        # #ff0000 text color (red)
+        elif COLOR_ATTR.match(attr) is not None:
+            # rgb = RGBColor.from_string(attr[1:])
+            # run.font.color.rgb = rgb
+            d['color'] = attr[1:]
+        # noinherit don’t inherit styles from supertoken
+
+    return d
+
+# token type -> font attributes, per pygments style class
+_style_tables = {}
+
+def get_style_table(style):
+    table = _style_tables.get(style)
+    if table is None:
+        table = { ttype: get_font_attributes(style_def)
+                for ttype, style_def in style.styles.items() }
+        _style_tables[style] = table
+    return table
+
+class PresentationPygmentsFormatter(Formatter):
+    # collects (text, attributes) runs for PPTXPresentation.add_runs
+
+    def __init__(self, **options):
+        Formatter.__init__(self, **options)
+        self.runs = []
+        self.style_table = get_style_table(self.style)
+
+    def get_font_attributes(self, ttype):
+        try:
+            return self.style_table[ttype]
+        except KeyError:
+            # token types that the style does not know look like their parent
+            t = ttype
+            while t not in self.style.styles:
+                t = t.parent
+            d = self.style_table[ttype] = get_font_attributes(self.style.styles[t])
+            return d
+
+    def format(self, tokensource, outfile):
+        elements = [ (text, self.get_font_attributes(ttype)) for ttype, text in tokensource ]
+
+        if elements[-1][0].rstrip('\n') == '':
+            del elements[-1]
+
+        self.runs = elements
+
+def highlight_runs(lexer_name, text, style):
+    formatter = PresentationPygmentsFormatter(style=style)
+    highlight(text, get_lexer(lexer_name), formatter)
+    return formatter.runs
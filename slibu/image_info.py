@@ -0,0 +1,92 @@
+import os
+import json
+from collections import namedtuple
+from .cache_util import write_atomic, file_digest
+
+# Image metadata, read from the image header only. The sha1 of the file is
+# used to share image parts between pictures that show the same image.
+
+ImageInfo = namedtuple('ImageInfo', ['sha1', 'width', 'height', 'dpi', 'format'])
+
+EMU_PER_INCH = 914400
+
+
+def normalize_dpi(pil_dpi):
+    # same as pptx.parts.image.Image.dpi, so that sizes come out the same
+    def int_dpi(dpi):
+        try:
+            dpi = int(round(float(dpi)))
+            if dpi < 1 or dpi > 2048:
+                dpi = 72
+        except (TypeError, ValueError):
+            dpi = 72
+        return dpi
+    if isinstance(pil_dpi, tuple):
+        return (int_dpi(pil_dpi[0]), int_dpi(pil_dpi[1]))
+    return (72, 72)
+
+def probe_image(path):
+    sha1 = file_digest(path)
+    # PIL only reads the header until the pixels are accessed
+    from PIL import Image
+    with Image.open(path) as img:
+        return ImageInfo(sha1, img.width, img.height,
+                normalize_dpi(img.info.get('dpi')), img.format)
+
+def native_size(info):
+    # size in EMU, as python-pptx calculates it
+    return (int(EMU_PER_INCH * info.width / info.dpi[0]),
+            int(EMU_PER_INCH * info.height / info.dpi[1]))
+
+def scale_size(info, cx, cy):
+    # same as pptx.parts.image.ImagePart.scale
+    image_cx, image_cy = native_size(info)
+    if cx and cy:
+        return cx, cy
+    if cx and not cy:
+        return cx, int(round(image_cy * float(cx) / float(image_cx)))
+    if not cx and cy:
+        return int(round(image_cx * float(cy) / float(image_cy))), cy
+    return image_cx, image_cy
+
+
+class ImageInfoCache:
+    """Memoizes ImageInfo per path, modification time and size. The cache
+    can be stored in a JSON file to reuse it in later runs."""
+
+    def __init__(self):
+        self.infos = {}
+        self.changed = False
+
+    def get(self, path):
+        path = os.path.abspath(path)
+        st = os.stat(path)
+        entry = self.infos.get(path)
+        if entry is not None and entry[0] == st.st_mtime_ns and entry[1] == st.st_size:
+            return entry[2]
+        info = probe_image(path)
+        self.infos[path] = (st.st_mtime_ns, st.st_size, info)
+        self.changed = True
+        return info
+
+    def load(self, fn):
+        try:
+            with open(fn) as f:
+                entries = json.load(f)
+        except (OSError, ValueError):
+            return
+        for path, (mtime, size, sha1, width, height, dpi, fmt) in entries.items():
+            if path not in self.infos:
+                self.infos[path] = (mtime, size, ImageInfo(sha1, width, height, tuple(dpi), fmt))
+
+    def save(self, fn):
+        if not self.changed:
+            return
+        entries = { path: [mtime, size] + list(info)
+            for path, (mtime, size, info) in list(self.infos.items()) }
+        write_atomic(fn, json.dumps(entries).encode('utf-8'))
+        self.changed = False
+
+
+# shared by all presentations in this process
+image_infos = ImageInfoCache()
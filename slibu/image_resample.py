@@ -0,0 +1,127 @@
+import io
+import os
+import math
+import hashlib
+from PIL import Image
+from .image_info import EMU_PER_INCH
+from .cache_util import LRUCache, write_atomic
+
+# formats that can be resampled
+RESAMPLE_FORMATS = ['JPEG', 'PNG', 'BMP', 'TIFF', 'GIF']
+# formats that can be re-encoded as JPEG if the image has no transparency
+JPEG_SOURCE_FORMATS = ['PNG', 'BMP', 'TIFF']
+
+# bytes of processed images kept in memory
+MEMORY_LIMIT = 64 << 20
+
+
+class ImageResampler:
+    """Downsamples images to the resolution they need at their displayed
+    size and optionally re-encodes opaque images as JPEG. Images with more
+    than one frame, like animated GIFs, are left as they are. Recently used
+    processed images are kept in memory and, if cache_dir is given, all of
+    them on disk."""
+
+    def __init__(self, dpi=None, image_format='keep', jpeg_quality=85, cache_dir=None):
+        self.dpi = dpi
+        self.image_format = image_format
+        self.jpeg_quality = jpeg_quality
+        self.cache_dir = cache_dir
+        self.variants = LRUCache(MEMORY_LIMIT, len)
+        self.opaque = {}
+        self.animated = {}
+        if cache_dir is not None:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def __repr__(self):
+        # used in the slide cache key
+        return 'ImageResampler(dpi=%r, image_format=%r, jpeg_quality=%r)' % (
+                self.dpi, self.image_format, self.jpeg_quality)
+
+    def __getstate__(self):
+        # do not send processed images to worker processes
+        state = self.__dict__.copy()
+        state['variants'] = LRUCache(MEMORY_LIMIT, len)
+        state['opaque'] = {}
+        state['animated'] = {}
+        return state
+
+    def target_size(self, info, cx, cy):
+        # pixel size needed to show the image at cx x cy EMU
+        if self.dpi is None:
+            return info.width, info.height
+        width = math.ceil(cx * self.dpi / EMU_PER_INCH)
+        height = math.ceil(cy * self.dpi / EMU_PER_INCH)
+        if width >= info.width or height >= info.height:
+            return info.width, info.height
+        return max(width, 1), max(height, 1)
+
+    def process(self, src, info, cx, cy):
+        # Returns the blob of the processed image, or None if the image can
+        # be used as it is.
+        if info.format not in RESAMPLE_FORMATS:
+            return None
+        width, height = self.target_size(info, cx, cy)
+        resize = (width, height) != (info.width, info.height)
+        reencode = self.image_format == 'jpeg' and info.format in JPEG_SOURCE_FORMATS
+        if reencode:
+            reencode = self.is_opaque(src, info)
+        if not resize and not reencode:
+            return None
+        if self.is_animated(src, info):
+            # convert would only keep the first frame
+            return None
+
+        key = hashlib.sha1(('%s %d %d %r' % (info.sha1, width, height, self)).encode()).hexdigest()
+        blob = self.variants.get(key)
+        if blob is None and self.cache_dir is not None:
+            try:
+                with open(os.path.join(self.cache_dir, key), 'rb') as f:
+                    blob = f.read()
+            except OSError:
+                pass
+        if blob is None:
+            blob = self.convert(src, info, width, height, reencode)
+            if self.cache_dir is not None:
+                write_atomic(os.path.join(self.cache_dir, key), blob)
+        self.variants.put(key, blob)
+        return blob
+
+    def is_opaque(self, src, info):
+        opaque = self.opaque.get(info.sha1)
+        if opaque is None:
+            with Image.open(src) as img:
+                opaque = not has_transparency(img)
+            self.opaque[info.sha1] = opaque
+        return opaque
+
+    def is_animated(self, src, info):
+        animated = self.animated.get(info.sha1)
+        if animated is None:
+            with Image.open(src) as img:
+                animated = getattr(img, 'n_frames', 1) > 1
+            self.animated[info.sha1] = animated
+        return animated
+
+    def convert(self, src, info, width, height, reencode):
+        with Image.open(src) as img:
+            fmt = info.format
+            if reencode:
+                fmt = 'JPEG'
+                img = img.convert('RGB')
+            if (width, height) != img.size:
+                img = img.resize((width, height), Image.LANCZOS)
+            out = io.BytesIO()
+            if fmt == 'JPEG':
+                if img.mode not in ['RGB', 'L', 'CMYK']:
+                    img = img.convert('RGB')
+                img.save(out, 'JPEG', quality=self.jpeg_quality, optimize=True)
+            else:
+                img.save(out, fmt)
+            return out.getvalue()
+
+
+def has_transparency(img):
+    if img.mode in ['RGBA', 'LA', 'PA']:
+        return True
+    return 'transparency' in img.info
@@ -0,0 +1,68 @@
+import zlib
+import zipfile
+from pptx.opc.serialized import PackageWriter
+
+# Writes presentation packages like python-pptx does, but with control over
+# the compression of each part. out_file can be a file name or any writable
+# binary stream, which does not have to be seekable (e.g. stdout).
+
+# media that is usually compressed already, deflating it again costs time
+# for nothing
+STORED_EXTENSIONS = [
+    'jpeg', 'jpg', 'png', 'gif', 'tif', 'tiff', 'wdp', 'jxr',
+    'mp3', 'mp4', 'm4a', 'm4v', 'mov', 'wma', 'wmv', 'avi', 'mpg', 'mpeg',
+]
+
+# a sample of this size from the start of a media part decides whether it
+# is worth deflating
+SAMPLE_SIZE = 1 << 16
+
+
+def is_compressible(blob):
+    sample = blob[:SAMPLE_SIZE]
+    return len(zlib.compress(sample, 1)) < 0.9 * len(sample)
+
+def save_package(prs, out_file, compress_level=None, store_media=True):
+    # compress_level is the deflate level (0-9) for the other parts, None
+    # for the zlib default and 0 to store them uncompressed
+    package = prs.part.package
+    SlibuPackageWriter(out_file, package._rels, tuple(package.iter_parts()),
+            compress_level, store_media)._write()
+
+
+class SlibuPackageWriter(PackageWriter):
+
+    def __init__(self, pkg_file, pkg_rels, parts, compress_level=None, store_media=True):
+        PackageWriter.__init__(self, pkg_file, pkg_rels, parts)
+        self.compress_level = compress_level
+        self.store_media = store_media
+
+    def _write(self):
+        with ZipPkgWriter(self._pkg_file, self.compress_level, self.store_media) as phys_writer:
+            self._write_content_types_stream(phys_writer)
+            self._write_pkg_rels(phys_writer)
+            self._write_parts(phys_writer)
+
+
+class ZipPkgWriter:
+
+    def __init__(self, pkg_file, compress_level=None, store_media=True):
+        compression = zipfile.ZIP_DEFLATED
+        if compress_level == 0:
+            compression = zipfile.ZIP_STORED
+        self.zipf = zipfile.ZipFile(pkg_file, 'w', compression=compression,
+                compresslevel=compress_level, strict_timestamps=False)
+        self.store_media = store_media
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.zipf.close()
+
+    def write(self, pack_uri, blob):
+        if self.store_media and pack_uri.ext.lower() in STORED_EXTENSIONS \
+                and not is_compressible(blob):
+            self.zipf.writestr(pack_uri.membername, blob, compress_type=zipfile.ZIP_STORED)
+        else:
+            self.zipf.writestr(pack_uri.membername, blob)
@@ -0,0 +1,78 @@
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from .chunking import is_slide_start
+from .pptx_writer import PPTXWriter
+
+# Renders slides in worker processes. Every worker has its own PPTXWriter
+# on the same template. It renders a slide chunk, exports the resulting
+# slides and drops them again. The parent process imports the exported
+# slides in document order, so the result is the same as a serial build.
+
+_writer = None
+
+def _init_worker(template, options):
+    global _writer
+    # a worker only has the slides of one chunk at a time, it does not need
+    # to spill them
+    options = { k: v for k, v in options.items() if k != 'spill_dir' }
+    _writer = PPTXWriter(template, **options)
+
+def _render_chunk(chunk):
+    presentation = _writer.presentation
+    first = presentation.slide_count()
+    depth = presentation.stack_depth()
+    runs_saved = presentation.runs_saved
+    code_cache = _writer.code_cache
+    hits, misses = code_cache.hits, code_cache.misses
+    _writer.feed(chunk)
+    slides = presentation.export_slides(first)
+    presentation.drop_slides(first, depth)
+    # counters of this chunk, for the stats of the parent
+    return slides, (presentation.runs_saved - runs_saved,
+            code_cache.hits - hits, code_cache.misses - misses)
+
+
+def feed_parallel(writer, chunks, jobs, cache=None):
+    # keep a bounded number of chunks in flight, so that results can be
+    # merged while the workers continue
+    max_pending = 2 * jobs
+    pending = deque()
+
+    def finish_one():
+        key, chunk, result = pending.popleft()
+        if isinstance(result, Future):
+            slides, (runs_saved, hits, misses) = result.result()
+            if slides is not None:
+                writer.presentation.runs_saved += runs_saved
+                writer.code_cache.hits += hits
+                writer.code_cache.misses += misses
+            if cache is not None:
+                cache.put(key, slides)
+        else:
+            slides = result
+        if slides is None:
+            # could not be exported, render it here instead
+            writer.feed(chunk)
+        else:
+            writer.presentation.import_slides(slides)
+
+    with ProcessPoolExecutor(jobs, initializer=_init_worker, initargs=(writer.template, writer.options)) as pool:
+        for chunk in chunks:
+            if chunk == [] or not is_slide_start(chunk[0]):
+                while pending:
+                    finish_one()
+                writer.feed(chunk)
+                continue
+            key = None
+            slides = None
+            if cache is not None:
+                key = cache.key(chunk)
+                slides = cache.get(key)
+            if slides is None:
+                pending.append((key, chunk, pool.submit(_render_chunk, chunk)))
+            else:
+                pending.append((key, chunk, slides))
+            while len(pending) > max_pending:
+                finish_one()
+        while pending:
+            finish_one()
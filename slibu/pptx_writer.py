@@ -1,106 +1,119 @@
 # coding: utf-8
 
-from pygments import highlight
-from pygments.lexers import get_lexer_by_name
-from pygments.formatter import Formatter
-import re
+import sys
+import json
 from .presentation import PPTXPresentation
+from .chunking import split_slides, is_slide_start
+from .code_cache import CodeCache
+from .profiler import PRESENTATION_OPERATIONS
+from .data_source import read_rows, select_rows, format_value, column_formats
 
-class PresentationPygmentsFormatter(Formatter):
-
-    def __init__(self, presentation, **options):
-        Formatter.__init__(self, **options)
-        self.presentation = presentation
-
-    def format(self, tokensource, outfile):
-
-        def get_font_attributes(ttype):
-            d = {
-                'italic': None,
-                'bold': None,
-                'underline': None,
-                'fontname': None,
-                'color': None,
-                'border': None,
-                'bg_color': None,
-            }
-
-            style = self.style.styles[ttype].split()
-            for attr in style:
-                # bold: render text as bold
-                if attr == 'bold':
-                    d['bold'] = True
-                elif attr == 'nobold':
-                    d['bold'] = False
-                # italic: render text italic
-                elif attr == 'italic':
-                    d['italic'] = True
-                elif attr == 'noitalic':
-                    d['italic'] = False
-                # underline render text underlined
-                # nounderline don’t render text underlined
-                elif attr == 'underline':
-                    d['underline'] = True
-                elif attr == 'nounderline':
-                    d['underline'] = False
-                # bg: transparent background
-                # bg:#000000 background color (black)
-                elif attr == 'bg:':
-                    # background not supported on text run, 
-                    d['bg_color'] = None
-                    pass
-                elif re.match(r'^bg:#[0-9A-Za-z]{6}', attr):
-                    # pptx does not support background fill for text runs,
-                    # only for complete shapes.
-                    # rgb = RGBColor.from_string(attr[4:])
-                    # run.font.fill.back_color.rgb = rgb
-                    d['bg_color'] = attr[4:]
-                # border: no border
-                elif re.match(r'^border', attr):
-                    d['border'] = None
-                # border:#ffffff border color (white)
-                elif re.match(r'^border:#[0-9A-Za-z]{6}', attr):
-                    d['border'] = attr[8:]
-                # #ff0000 text color (red)
-                elif re.match(r'^#[0-9A-Za-z]{6}', attr) is not None:
-                    # rgb = RGBColor.from_string(attr[1:])
-                    # run.font.color.rgb = rgb
-                    d['color'] = attr[1:]
-                # noinherit don’t inherit styles from supertoken
-
-            return d
- 
-        elements = [ (text, get_font_attributes(ttype)) for ttype, text in tokensource ]
-
-        if elements[-1][0].rstrip('\n') == '':
-            del elements[-1]
-
-        for text, style in elements:
-            self.presentation.add_text(text, verbatim=True, **style)
+# pygments style for code blocks
+CODE_STYLE = 'default'
 
-class PPTXWriter:
+# boxes with these elements change more than their own shape and are always
+# rendered
+UNCACHED_BOX_TYPES = [ 'title', 'slide' ]
+
+# inline elements that become a single run: element -> (text, attributes)
+
+def run_text(e):
+    return e['text'], {}
+
+def run_emphasis(e):
+    text = "".join([ x.get('text') for x in e['children'] ])
+    return text, { 'italic': True }
+
+def run_strong(e):
+    text = "".join([ x.get('text') for x in e['children'] ])
+    return text, { 'bold': True }
+
+def run_codespan(e):
+    return e['text'], { 'verbatim': True, 'fontname': 'Courier' }
+
+def inline_text(ast):
+    # the plain text of inline elements
+    return "".join([ e.get('text') or inline_text(e.get('children', [])) for e in ast ])
 
-    def __init__(self, template):
-        self.presentation = PPTXPresentation(template)
+inline_runs = {
+    'text': run_text,
+    'emphasis': run_emphasis,
+    'strong': run_strong,
+    'codespan': run_codespan,
+}
 
-    def save(self, outfn):
-        self.presentation.save(outfn)
+def has_types(ast, types):
+    for e in ast:
+        if e['type'] in types:
+            return True
+        children = e.get('children')
+        if isinstance(children, list) and has_types(children, types):
+            return True
+    return False
+
+
+class PPTXWriter:
+
+    def __init__(self, template, code_cache=None, profiler=None, **options):
+        self.template = template
+        if code_cache is None:
+            code_cache = CodeCache()
+        self.code_cache = code_cache
+        self.options = dict(options, code_cache=code_cache)
+        self.presentation = PPTXPresentation(template, **options)
+        # rendered boxes that are the same on every slide they are on, such
+        # as footers: key -> p:sp element
+        self.box_fragments = {}
+        self.profiler = profiler
+        if profiler is not None:
+            # only the profiled instance pays for the timers
+            self.feed = self.feed_profiled
+            profiler.instrument(self.presentation, PRESENTATION_OPERATIONS)
+            profiler.instrument(self, ['highlight'])
+
+    def save(self, outfn, **save_options):
+        self.presentation.save(outfn, **save_options)
 
     def feed(self, ast):
         for e in ast:
-            print("DEBUG:", "e=", e)
+            self.feed_one(e)
+
+    def feed_profiled(self, ast):
+        for e in ast:
+            self.profiler.feed(self.feed_one, e)
+
+    def feed_one(self, e):
+        try:
+            h = self.handlers[e['type']]
             try:
-                h = self.handlers[e['type']]
-                try:
-                    h(self, e)
-                except Exception as e:
-                    print("EXCEPTION", e)
-                    raise(e)
-            except KeyError:
-                self.handle_undefined(e)
+                h(self, e)
+            except Exception as e:
+                print("EXCEPTION", e, file=sys.stderr)
+                raise(e)
+        except KeyError:
+            self.handle_undefined(e)
+
+    def feed_slides(self, ast, cache=None):
+        self.feed_chunks(split_slides(ast), cache)
+
+    def feed_chunks(self, chunks, cache=None):
+        # like feed, but renders slide by slide and reuses slides from cache
+        # when their AST chunk did not change
+        for chunk in chunks:
+            if cache is None or chunk == [] or not is_slide_start(chunk[0]):
+                self.feed(chunk)
+                continue
+            key = cache.key(chunk)
+            slides = cache.get(key)
+            if slides is not None:
+                self.presentation.import_slides(slides)
+            else:
+                first = self.presentation.slide_count()
+                self.feed(chunk)
+                cache.put(key, self.presentation.export_slides(first))
 
     def handle_undefined(self, e):
-        print("ERROR: No handler for", e['type'])
+        print("ERROR: No handler for", e['type'], file=sys.stderr)
 
     def handle_heading(self, e):
         if e['level'] == 1:
@@ -108,29 +121,45 @@ class PPTXWriter:
         elif e['level'] == 2:
             self.presentation.add_slide(layout="Title and Content", title=e['children'][0]['text'])
 
+    def feed_inline(self, ast):
+        # like feed, but collects the runs of neighbouring inline elements
+        # so that they can be merged
+        runs = []
+        for e in ast:
+            run = inline_runs.get(e['type'])
+            if run is not None:
+                runs.append(run(e))
+            else:
+                self.presentation.add_runs(runs)
+                runs = []
+                self.feed([e])
+        self.presentation.add_runs(runs)
+
     def handle_paragraph(self, e):
         if self.presentation.has_content_placeholder():
             self.presentation.add_paragraph()
-            self.feed(e['children'])
+            self.feed_inline(e['children'])
 
     def handle_block_text(self, e):
         if self.presentation.has_content_placeholder():
             self.presentation.add_paragraph()
-            self.feed(e['children'])
+            self.feed_inline(e['children'])
 
     def handle_text(self, e):
-        self.presentation.add_text(e['text'])
+        text, attrs = run_text(e)
+        self.presentation.add_text(text, **attrs)
 
     def handle_emphasis(self, e):
-        text = "".join([ x.get('text') for x in e['children'] ])
-        self.presentation.add_text(text, italic=True)
+        text, attrs = run_emphasis(e)
+        self.presentation.add_text(text, **attrs)
 
     def handle_strong(self, e):
-        text = "".join([ x.get('text') for x in e['children'] ])
-        self.presentation.add_text(text, bold=True)
+        text, attrs = run_strong(e)
+        self.presentation.add_text(text, **attrs)
 
     def handle_codespan(self, e):
-        self.presentation.add_text(e['text'], verbatim=True, fontname='Courier')
+        text, attrs = run_codespan(e)
+        self.presentation.add_text(text, **attrs)
 
     def handle_block_quote(self, e):
         # TODO: fix fontname
@@ -159,45 +188,79 @@ class PPTXWriter:
             if e['info'] is None:
                 self.presentation.add_text(text, verbatim=True)
             else:
-                lexer = get_lexer_by_name(e['info'].strip())
-                formatter = PresentationPygmentsFormatter(self.presentation)
-                result = highlight(text, lexer, formatter)
+                runs = self.highlight(e['info'].strip(), text)
+                self.presentation.add_runs(runs, verbatim=True)
 
             self.presentation.pop_text_layout()
 
-    def handle_table(self, e):
-        rows = len(e['children'][1]['children']) + 1
-        cols = len(e['children'][0]['children'])
-        self.presentation.add_table(rows, cols)
-        self.row = 0
-        self.feed(e['children'])
+    def highlight(self, lexer_name, text):
+        key = self.code_cache.key(lexer_name, text, CODE_STYLE)
+        runs = self.code_cache.get(key)
+        if runs is None:
+            # Pygments is only imported for the first highlighted code block
+            from .highlighting import highlight_runs
+            runs = highlight_runs(lexer_name, text, CODE_STYLE)
+            self.code_cache.put(key, runs)
+        return runs
 
-    def handle_table_head(self, e):
-        self.col = 0
-        for ce in e['children']:
-            self.feed([ce])
-            self.col += 1
-        self.row += 1
-
-    def handle_table_body(self, e):
-        self.feed(e['children'])
-
-    def handle_table_row(self, e):
-        self.col = 0
-        for ce in e['children']:
-            self.feed([ce])
-            self.col += 1
-        self.row += 1
+    def handle_table(self, e):
+        rows = []
+        for part in e['children']:
+            if part['type'] == 'table_head':
+                rows.append(part['children'])
+            else:
+                rows.extend(row['children'] for row in part['children'])
+        self.add_table(rows[0], rows[1:], self.handle_table_cell,
+                lambda row: [ inline_text(cell['children']) for cell in row ])
+
+    def handle_data_table(self, e):
+        options = e['options']
+        header, rows = read_rows(e['src'], options.get('delimiter'))
+        header, rows = select_rows(header, rows, options.get('columns'),
+                options.get('sort'), options.get('top'))
+        formats = column_formats(header, options.get('number_format'))
+        rows = ( [ format_value(v, f) for v, f in zip(row, formats) ] for row in rows )
+        self.add_table(header, rows, self.presentation.add_text, lambda row: row)
+
+    def add_table(self, header, rows, fill_cell, row_texts):
+        # The header row is repeated when the table is continued on the
+        # next slide. fill_cell adds the content of a cell.
+        for i, page in enumerate(self.presentation.paginate_table(header, rows, row_texts)):
+            if i > 0:
+                self.presentation.add_continuation_slide()
+            page.insert(0, header)
+            self.presentation.add_table(len(page), len(header))
+            self.presentation.fill_table(page, fill_cell)
 
     def handle_table_cell(self, e):
-        self.presentation.start_table_cell(self.row, self.col)
-        self.feed(e['children'])
-        self.presentation.end_table_cell()
+        self.feed_inline(e['children'])
 
     def handle_box(self, e):
+        # A box that renders to a single shape without relationships, such as
+        # a text box, is rendered once and copied to later slides.
+        key = self.box_key(e)
+        fragment = self.box_fragments.get(key)
+        if fragment is not None:
+            self.presentation.add_fragment(fragment)
+            return
+        mark = self.presentation.fragment_mark()
         self.presentation.start_box(**e['options'])
+        box = self.presentation.cph()._element
         self.feed(e['children'])
         self.presentation.end_box()
+        if key is not None:
+            self.box_fragments[key] = self.presentation.get_fragment(mark, box)
+
+    def box_key(self, e):
+        # The box, the text layout it inherits and the shape it is placed
+        # in decide what it looks like. None if it must always be rendered.
+        if has_types(e['children'], UNCACHED_BOX_TYPES):
+            return None
+        cph = self.presentation.cph()
+        dim = None
+        if cph is not None:
+            dim = self.presentation.get_box_dimensions_from_shape(cph)
+        return json.dumps([e, self.presentation.tly(), dim], sort_keys=True, default=repr)
 
     def handle_img(self, e):
         self.presentation.add_picture(e['src'], **e['options'])
@@ -241,10 +304,7 @@ class PPTXWriter:
         'img': handle_img,
         'box': handle_box,
         'table': handle_table,
-        'table_head': handle_table_head,
-        'table_body': handle_table_body,
-        'table_row': handle_table_row,
-        'table_cell': handle_table_cell,
+        'data_table': handle_data_table,
         'block_code': handle_block_code,
         'codespan': handle_codespan,
         'block_quote': handle_block_quote,
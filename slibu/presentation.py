@@ -1,11 +1,28 @@
 # coding: utf-8
-from pptx import Presentation
 from pptx.util import Centipoints, Cm, Emu, Inches, Mm, Pt
 from pptx.enum.text import MSO_AUTO_SIZE
 from pptx.enum.text import MSO_ANCHOR
 from pptx.dml.color import RGBColor
+from pptx.opc.constants import RELATIONSHIP_TYPE as RT
+from pptx.opc.constants import CONTENT_TYPE as CT
+from pptx.opc.constants import RELATIONSHIP_TARGET_MODE as RTM
+from pptx.opc.package import _Relationship
+from pptx.oxml import parse_xml
+from pptx.opc.packuri import PackURI
+from pptx.opc.spec import image_content_types
+from pptx.parts.image import Image as PPTXImage, ImagePart
+from pptx.parts.slide import SlideLayoutPart, SlidePart
+from pptx.oxml.slide import CT_Slide
+from pptx.oxml.text import CT_RegularTextRun
+from pptx.text.text import _Run, TextFrame
 from lxml import etree
-from PIL import Image
+import os
+import copy
+import math
+from .template import open_template
+from .package_writer import save_package
+from .image_info import image_infos, scale_size
+from .spill import SpillStore, FileImagePart, IMAGE_EXTENSIONS
 
 
 def set_font_attr(run, key, value):
@@ -32,9 +49,6 @@ def set_shape_bg_alpha(shape, key, value):
         except AttributeError:
             pass
 
-def set_unsupported(run, key, value):
-    pass
-
 def set_attr_on_pptx_object(obj, setter, key, options, tly):
     attr_key = key
     if type(setter) is tuple:
@@ -46,9 +60,61 @@ def set_attr_on_pptx_object(obj, setter, key, options, tly):
     elif tly_value is not None:
         setter(obj, attr_key, tly_value)
 
-def set_run_verbatim(run, key, value):
-    if value == False:
-        run.text = run.text.replace('\n',' ')
+RELATIONSHIP_NS = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+
+def rename_rIds(element, rIds):
+    # replace relationship ids in all r:* attributes of element
+    for e in element.iter():
+        for k, v in e.attrib.items():
+            if k.startswith(RELATIONSHIP_NS) and v in rIds:
+                e.attrib[k] = rIds[v]
+
+# text attributes that change how a run looks, border and bg_color are not
+# supported on runs
+RUN_ATTRIBUTES = [ 'verbatim', 'italic', 'bold', 'underline', 'fontname', 'font_size', 'color' ]
+
+DRAWINGML_NS = "{http://schemas.openxmlformats.org/drawingml/2006/main}"
+A_NSDECL = 'xmlns:a="http://schemas.openxmlformats.org/drawingml/2006/main"'
+
+# a:rPr elements to clone into new runs, keyed by the resolved run
+# attributes without verbatim. None means the run has no a:rPr.
+_run_properties = {}
+
+def get_run_properties(resolved):
+    key = tuple(resolved[1:])
+    try:
+        return _run_properties[key]
+    except KeyError:
+        pass
+    # apply the attributes with python-pptx once, to a detached run
+    attr_setters = {
+            'italic': set_font_attr,
+            'bold': set_font_attr,
+            'underline': set_font_attr,
+            'fontname': (set_font_attr, 'name'),
+            'font_size': set_font_size,
+            'color': set_font_color,
+    }
+    run = _Run(parse_xml('<a:r %s><a:t/></a:r>' % A_NSDECL), None)
+    options = dict(zip(RUN_ATTRIBUTES, resolved))
+    for attr in RUN_ATTRIBUTES[1:]:
+        set_attr_on_pptx_object(run, attr_setters[attr], attr, options, {})
+    rPr = run._r.rPr
+    _run_properties[key] = rPr
+    return rPr
+
+# bullet and numbering elements to clone into a:pPr, in document order
+BULLET_ELEMENTS = [
+    parse_xml('<a:buChar %s char="•"/>' % A_NSDECL),
+    parse_xml('<a:buFont %s typeface="Arial" panose="020B0604020202020204" pitchFamily="34" charset="0"/>' % A_NSDECL),
+]
+NUMBER_ELEMENTS = [
+    parse_xml('<a:buAutoNum %s type="arabicPeriod"/>' % A_NSDECL),
+]
+
+# default margins of table cells, in EMU
+TABLE_CELL_MARGIN_LR = 91440
+TABLE_CELL_MARGIN_TB = 45720
 
 def set_tf_valign(tf, key, value):
     if value == 'top':
@@ -59,29 +125,110 @@ def set_tf_valign(tf, key, value):
         tf.vertical_anchor = MSO_ANCHOR.BOTTOM
 
 
+def index_layouts(prs):
+    # Returns layout name -> (layout, position of the content placeholder
+    # in the shapes of a new slide with that layout, or None). A new slide
+    # gets the cloneable placeholders of its layout, in the same order.
+    index = {}
+    for layout in prs.slide_layouts:
+        if layout.name in index:
+            continue
+        position = None
+        for i, ph in enumerate(layout.iter_cloneable_placeholders()):
+            # BODY=2, OBJECT=7
+            if ph.placeholder_format.type == 7:
+                position = i
+                break
+        index[layout.name] = (layout, position)
+    return index
+
+
 class PPTXPresentation:
-    def __init__(self, template):
+    def __init__(self, template, resampler=None, shared_backgrounds=False, spill_dir=None):
         # self.prs = Presentation()
-        self.prs = Presentation(template)
+        self.prs = open_template(template)
+        self.resampler = resampler
+        # put slide backgrounds in generated layouts instead of on the slides
+        self.shared_backgrounds = shared_backgrounds
+        # (layout name, image sha1, dimensions) -> generated layout name
+        self.background_layouts = {}
+        # generated layout name -> (layout name, image part, dimensions)
+        self.generated_layouts = {}
+        # with a spill directory, finished slides and images are kept in
+        # files there instead of in memory
+        self.spill = None
+        if spill_dir is not None:
+            self.spill = SpillStore(spill_dir)
+        # (rId, part) of the slides that are not spilled yet
+        self.live_slides = []
+        # id for the next p:sldId, see add_slide_part
+        self.next_slide_id = None
+        self.image_parts = None
+        self.image_idxs = None
+        self.runs_saved = 0
         self.cphs = []
         self.tfs = []
         self.tlys = []
-
-    def save(self, outfn):
-        self.prs.save(outfn)
+        self.pending_slide = None
+        # position of the current slide on the stacks
+        self.slide_idx = None
+        # the pending_slide the current slide was made from
+        self.slide_spec = None
+        self.layouts = index_layouts(self.prs)
+        self.content_ph = None
+
+    def save(self, outfn, **save_options):
+        # see package_writer.save_package for the options
+        self._ensure_slide()
+        save_package(self.prs, outfn, **save_options)
 
     def add_slide(self, layout="Title and Content", title=""):
-        layout = self.get_layout_by_name(layout)
-        self.slide = self.prs.slides.add_slide(layout)
-        self.slide.shapes.title.text = title
+        # The slide is only created when something is added to it, so that
+        # slide directives can still change its layout, background and title
+        # box without building it twice. Until then, its content placeholder
+        # and text frame are None on the stacks.
+        self._ensure_slide()
+        self.get_layout_by_name(layout)
+        self.pending_slide = {
+            'layout': layout,
+            'title': title,
+            'operations': [],
+            'idx': len(self.cphs),
+        }
+        self._push_cph(None)
+        self._push_tf(None, True)
+        self._push_tly(self.get_default_text_layout(), inherit=False)
 
-        content_ph = self.find_content_placeholder()
+    def _ensure_slide(self):
+        spec = self.pending_slide
+        if spec is None:
+            return
+        self.pending_slide = None
+        layout_name = spec['layout']
+        if spec.get('background') is not None:
+            image_part, dim = self.get_background_image(*spec['background'])
+            layout_name = self.get_background_layout(layout_name, image_part, dim)
+        layout, position = self.layouts[layout_name]
+        self.spill_slides()
+        part = self.add_slide_part(CT_Slide.new())
+        part.relate_to(layout.part, RT.SLIDE_LAYOUT)
+        self.slide = part.slide
+        self.slide.shapes.clone_layout_placeholders(layout)
+        self.slide.shapes.title.text = spec['title']
+
+        content_ph = None
+        if position is not None:
+            content_ph = self.slide.shapes[position]
+        self.content_ph = content_ph
         text_frame = None
         if content_ph is not None:
             text_frame = content_ph.text_frame
-        self._push_cph(content_ph)
-        self._push_tf(text_frame, True)
-        self._push_tly(self.get_default_text_layout(), inherit=False)
+        self.slide_idx = spec['idx']
+        self.slide_spec = spec
+        self.cphs[spec['idx']] = content_ph
+        self.tfs[spec['idx']] = (text_frame, True)
+        for operation, args in spec['operations']:
+            operation(*args)
 
     def add_paragraph(self):
         # if text frame is virgin, use first paragraph, otherwise create one
@@ -101,49 +248,75 @@ class PPTXPresentation:
         self._set_tf(tf, False)
 
     def add_text(self, text, **attrs):
-        run = self.create_run()
-        # TODO: make flag
-
-        run.text = text
-
+        # Writes the a:r element directly, with a copy of the a:rPr that
+        # python-pptx would create for these attributes.
+        self._ensure_slide()
+        resolved = self.resolve_run_attributes(attrs, {}, self.tly())
+        p = self.paragraph._p
+        r = p.makeelement(DRAWINGML_NS + 'r', {})
+        end = p.find(DRAWINGML_NS + 'endParaRPr')
+        if end is None:
+            p.append(r)
+        else:
+            end.addprevious(r)
+        rPr = get_run_properties(resolved)
+        if rPr is not None:
+            r.append(copy.deepcopy(rPr))
+        t = etree.SubElement(r, DRAWINGML_NS + 't')
+        if resolved[0] == False:
+            # not verbatim
+            text = text.replace('\n', ' ')
+        t.text = CT_RegularTextRun._escape_ctrl_chars(text)
+
+    def add_runs(self, runs, **attrs):
+        # Adds a list of (text, attrs) runs. Neighbouring runs that would
+        # look the same are merged into one run. attrs apply to all runs.
         tly = self.tly()
-
-        attr_setters = {
-                'verbatim': set_run_verbatim,
-                'italic': set_font_attr,
-                'bold': set_font_attr,
-                'underline': set_font_attr,
-                'fontname': (set_font_attr, 'name'),
-                'font_size': set_font_size,
-                'color': set_font_color,
-                'border': set_unsupported,
-                'bg_color': set_unsupported,
-        }
-
-        for key in [ 'verbatim', 'italic', 'bold', 'underline', 'fontname', 'font_size', 'color', 'border', 'bg_color' ]:
-            setter = attr_setters.get(key)
-            set_attr_on_pptx_object(run, setter, key, attrs, tly)
-
+        texts = []
+        for text, run_attrs in runs:
+            resolved = self.resolve_run_attributes(run_attrs, attrs, tly)
+            if texts != [] and resolved == group_resolved:
+                texts.append(text)
+                self.runs_saved += 1
+            else:
+                if texts != []:
+                    self.add_text(''.join(texts), **group_attrs)
+                texts = [text]
+                group_attrs = dict(attrs)
+                group_attrs.update((k, v) for k, v in run_attrs.items() if v is not None)
+                group_resolved = resolved
+        if texts != []:
+            self.add_text(''.join(texts), **group_attrs)
+
+    def resolve_run_attributes(self, run_attrs, attrs, tly):
+        resolved = []
+        for key in RUN_ATTRIBUTES:
+            value = run_attrs.get(key)
+            if value is None:
+                value = attrs.get(key)
+            if value is None:
+                value = tly.get(key)
+            resolved.append(value)
+        return resolved
 
     def add_list_bullet(self):
         # TODO: find out what panose does
         # TODO: set marL on pPr
-        self.paragraph._pPr.insert(0, etree.Element("{http://schemas.openxmlformats.org/drawingml/2006/main}buFont", typeface="Arial", panose="020B0604020202020204", pitchFamily="34", charset="0"))
-        self.paragraph._pPr.insert(0, etree.Element("{http://schemas.openxmlformats.org/drawingml/2006/main}buChar", char="•"))
+        pPr = self.paragraph._pPr
+        for i, e in enumerate(BULLET_ELEMENTS):
+            pPr.insert(i, copy.deepcopy(e))
         # self.paragraph._pPr.attrib['marL'] = "1200150" 
-        self.paragraph._pPr.attrib['indent'] = "-285750"
+        pPr.attrib['indent'] = "-285750"
 
     def add_list_number(self):
-        self.paragraph._pPr.insert(0, etree.Element("{http://schemas.openxmlformats.org/drawingml/2006/main}buAutoNum", type="arabicPeriod"))
+        pPr = self.paragraph._pPr
+        for i, e in enumerate(NUMBER_ELEMENTS):
+            pPr.insert(i, copy.deepcopy(e))
         # TODO: fix this length
-        self.paragraph._pPr.attrib['indent'] = "-285750"
+        pPr.attrib['indent'] = "-285750"
         # self.paragraph._pPr.attrib['marL'] = "1200150" 
         # self.paragraph._pPr.attrib['indent'] = "-5000"
 
-    def create_run(self):
-        run = self.paragraph.add_run()
-        return run
-
     def add_picture(self, src, left=None, top=None, width=None, height=None, **options):
         left = self.make_length('left', left)
         top = self.make_length('top', top)
@@ -155,54 +328,120 @@ class PPTXPresentation:
         if top is None:
             top = self.cph().top
 
+        info = image_infos.get(src)
         if width is None and height is None:
             # TODO: fix this so that in img tags, we use the actual dimensions, not scaling
             # add a 'scale' option to this method
             width = self.get_cph_width()
             height = self.get_cph_height()
-            img = Image.open(src)
-            actual_width = img.width
-            actual_height = img.height
+            actual_width = info.width
+            actual_height = info.height
             if actual_width/width <= actual_height/height:
                 width = None
             else:
                 height = None
 
-        picture = self.slide.shapes.add_picture(src,
-                left, top, width, height)
+        picture = self.add_image(src, info, left, top, width, height)
 
         rotation = options.get('rotation')
         if rotation is not None:
             picture.rotation = rotation
 
     def add_table(self, rows, columns):
+        self._ensure_slide()
         cph = self.cph()
         # shape = self.slide.shapes.add_table(rows, columns, cph.left, cph.top, cph.width, cph.height)
         shape = self.slide.shapes.add_table(rows, columns, cph.left, cph.top, cph.width, 0)
         self.table = shape.table
         # set column widths
-        print(dir(self.table))
-        print("TBL width", self.cph().width)
-        table_width = self.cph().width
+        table_width = cph.width
+        if self.tly().get('column_widths') is not None:
+            for i, width in enumerate(self.get_column_widths(columns, table_width)):
+                self.table.columns[i].width = width
 
+    def get_column_widths(self, columns, table_width):
         col_widths = self.tly().get('column_widths')
-        if col_widths is not None:
-            col_total = sum(col_widths)
-            col_pcts = [ c/col_total for c in col_widths ]
-            # print("COL PCT", col_pcts)
-            for i,c in enumerate(col_pcts):
-                # print(dir(self.table.columns))
-                # print(self.table.columns[i])
-                self.table.columns[i].width = round(c * table_width)
-
-    def start_table_cell(self, row, column):
-        cell = self.table.cell(row, column)
-        tf = cell.text_frame
-        self._push_tf(tf, True)
-        self.add_paragraph()
-    
-    def end_table_cell(self):
-        self._pop_tf()
+        if col_widths is None:
+            return [ table_width // columns ] * columns
+        col_total = sum(col_widths)
+        col_pcts = [ c/col_total for c in col_widths ]
+        return [ round(c * table_width) for c in col_pcts ]
+
+    def fill_table(self, rows, fill_cell):
+        # Fills the cells of the current table in one pass over the a:tbl
+        # element. rows is a list of rows of cell contents, fill_cell adds
+        # the content of one cell to the current paragraph.
+        tbl = self.table._tbl
+        for tr, row in zip(tbl.tr_lst, rows):
+            for tc, cell in zip(tr.tc_lst, row):
+                self._push_tf(TextFrame(tc.get_or_add_txBody(), self.table), True)
+                self.add_paragraph()
+                fill_cell(cell)
+                self._pop_tf()
+
+    def paginate_table(self, header, rows, row_texts):
+        # Splits the body rows of a table over slides, if the text layout
+        # asks for it. row_texts gives the texts of the cells of a row.
+        # Yields the body rows of each slide, reading rows as it goes.
+        tly = self.tly()
+        max_rows = tly.get('table_max_rows')
+        fit = tly.get('table_fit')
+        if (max_rows is None and not fit) or not self.is_in_content_placeholder():
+            yield list(rows)
+            return
+        max_height = self.cph().height
+        header_texts = row_texts(header)
+        widths = self.get_column_widths(len(header_texts), self.cph().width)
+        header_height = self.estimate_row_height(header_texts, widths)
+        page = []
+        height = header_height
+        for row in rows:
+            row_height = 0
+            if fit:
+                row_height = self.estimate_row_height(row_texts(row), widths)
+            if page != [] and ((max_rows is not None and len(page) >= max_rows)
+                    or (fit and height + row_height > max_height)):
+                yield page
+                page = []
+                height = header_height
+            page.append(row)
+            height += row_height
+        yield page
+
+    def estimate_row_height(self, texts, widths):
+        # A rough estimate of the height PowerPoint gives a table row: lines
+        # of text at an average character width of half the font size, plus
+        # the default cell margins.
+        font_size = Pt(self.tly().get('font_size') or 18)
+        line_height = font_size * 1.2
+        lines = 1
+        for text, width in zip(texts, widths):
+            chars_per_line = max(1, int((width - 2 * TABLE_CELL_MARGIN_LR) / (font_size * 0.5)))
+            cell_lines = sum(max(1, math.ceil(len(line) / chars_per_line)) for line in text.split('\n'))
+            lines = max(lines, cell_lines)
+        return round(lines * line_height) + 2 * TABLE_CELL_MARGIN_TB
+
+    def is_in_content_placeholder(self):
+        cph = self.cph()
+        content_ph = self.content_ph
+        return cph is not None and content_ph is not None and cph._element is content_ph._element
+
+    def add_continuation_slide(self):
+        # A new slide like the current one, to continue a table on. The
+        # table can be in a list or a textstyle that pushed text layouts of
+        # its own, so the new slide takes the place of the current slide on
+        # the stacks, and keeps the text layouts. Its background and title
+        # box are set up again like those of the current slide.
+        self._ensure_slide()
+        spec = self.slide_spec
+        self.pending_slide = {
+            'layout': spec['layout'],
+            'title': self.slide.shapes.title.text,
+            'operations': list(spec['operations']),
+            'background': spec.get('background'),
+            'idx': self.slide_idx,
+        }
+        self._ensure_slide()
 
     def start_box(self, **options):
 
@@ -248,29 +487,256 @@ class PPTXPresentation:
         self._pop_tf()
         self._pop_cph()
 
+    def fragment_mark(self):
+        # the current slide and its number of shapes and relationships, to
+        # find out later what a box added to it
+        self._ensure_slide()
+        return self.slide, len(self.slide.shapes._spTree), len(self.slide.part.rels)
+
+    def get_fragment(self, mark, element):
+        # Returns a copy of element, if it is the only shape that was added
+        # since mark and no relationships were added, otherwise None.
+        slide, count, rels = mark
+        if slide is not self.slide or len(self.slide.part.rels) != rels \
+                or len(self.slide.shapes._spTree) != count + 1:
+            return None
+        return copy.deepcopy(element)
+
+    def add_fragment(self, element):
+        # adds a copy of a shape from get_fragment, with a new id and name
+        # like shapes.add_textbox gives it
+        self._ensure_slide()
+        shapes = self.slide.shapes
+        sp = copy.deepcopy(element)
+        id_ = shapes._next_shape_id
+        sp.nvSpPr.cNvPr.id = id_
+        sp.nvSpPr.cNvPr.name = 'TextBox %d' % (id_ - 1)
+        shapes._spTree.insert_element_before(sp, 'p:extLst')
+
     def drop_slide(self):
-        self._pop_tly()
-        self._pop_tf()
-        self._pop_cph()
-        rId = self.prs.slides._sldIdLst[-1].rId
+        # drops the last slide, but leaves the stacks alone
+        if self.pending_slide is not None:
+            self.pending_slide = None
+            return
+        sldId = self.prs.slides._sldIdLst[-1]
+        rId = sldId.rId
+        self.live_slides = [ (r, part) for r, part in self.live_slides if r != rId ]
         self.prs.part.drop_rel(rId)
+        if self.next_slide_id == sldId.id + 1:
+            self.next_slide_id = sldId.id
         del self.prs.slides._sldIdLst[-1]
 
+    def slide_count(self):
+        self._ensure_slide()
+        return len(self.prs.slides._sldIdLst)
+
+    def export_slides(self, first):
+        # Returns the slides from position first onwards as plain data that
+        # import_slides can add to another presentation, or None if a slide
+        # has relationships other than its layout and images.
+        self._ensure_slide()
+        slides = []
+        for sldId in self.prs.slides._sldIdLst[first:]:
+            part = self.prs.part.related_part(sldId.rId)
+            layout_rId = None
+            images = []
+            for rId, rel in part.rels.items():
+                if rel.is_external:
+                    return None
+                if rel.reltype == RT.SLIDE_LAYOUT:
+                    layout_rId = rId
+                    # spilled slide parts have no slide_layout
+                    layout = rel.target_part.slide_layout.name
+                elif rel.reltype == RT.IMAGE:
+                    image_part = rel.target_part
+                    images.append((rId, image_part.blob, image_part._filename))
+                else:
+                    return None
+            background = None
+            if layout in self.generated_layouts:
+                layout, image_part, dim = self.generated_layouts[layout]
+                background = (image_part.blob, image_part._filename, list(dim))
+            slides.append({
+                'layout': layout,
+                'layout_rId': layout_rId,
+                'xml': part.blob,
+                'images': images,
+                'background': background,
+            })
+        return slides
+
+    def import_slides(self, slides):
+        self._ensure_slide()
+        for s in slides:
+            layout_name = s['layout']
+            if s.get('background') is not None:
+                blob, filename, dim = s['background']
+                image_part = self.get_or_add_image_part(PPTXImage(blob, filename))
+                layout_name = self.get_background_layout(layout_name, image_part, dim)
+            layout = self.get_layout_by_name(layout_name)
+            element = parse_xml(s['xml'])
+            part = self.add_slide_part(element)
+            rIds = { s['layout_rId']: part.relate_to(layout.part, RT.SLIDE_LAYOUT) }
+            for old_rId, blob, filename in s['images']:
+                image_part = self.get_or_add_image_part(PPTXImage(blob, filename))
+                rIds[old_rId] = part.relate_to(image_part, RT.IMAGE)
+            rename_rIds(element, rIds)
+        self.spill_slides()
+
+    def add_slide_part(self, element):
+        # Adds a slide part with element as its XML at the end of the
+        # presentation. python-pptx searches all relationships and slide ids
+        # of the presentation for every new slide, so that a build takes
+        # quadratic time; here the next rId and slide id are counted.
+        sldIdLst = self.prs.slides._sldIdLst
+        partname = PackURI('/ppt/slides/slide%d.xml' % (len(sldIdLst) + 1))
+        part = SlidePart(partname, CT.PML_SLIDE, self.prs.part.package, element)
+        rels = self.prs.part.rels
+        n = len(rels) + 1
+        while 'rId%d' % n in rels:
+            n += 1
+        rId = 'rId%d' % n
+        rels._rels[rId] = _Relationship(rels._base_uri, rId, RT.SLIDE, RTM.INTERNAL, part)
+        if self.next_slide_id is None:
+            # slide ids start at 256
+            self.next_slide_id = max([ 255 ] + [ s.id for s in sldIdLst.sldId_lst ]) + 1
+        sldIdLst._add_sldId(id=self.next_slide_id, rId=rId)
+        self.next_slide_id += 1
+        if self.spill is not None:
+            self.live_slides.append((rId, part))
+        return part
+
+    def spill_slides(self):
+        # Replaces the parts of the slides that are done by parts that read
+        # them from the spill directory, and lets go of everything that
+        # refers to their XML.
+        if self.live_slides == []:
+            return
+        rels = self.prs.part.rels
+        for rId, part in self.live_slides:
+            # a new relationship, the old one caches its target part
+            rels._rels[rId] = _Relationship(rels._base_uri, rId, RT.SLIDE, RTM.INTERNAL,
+                    self.spill.spill_slide(part))
+        self.live_slides = []
+        self.slide = None
+        self.content_ph = None
+        self.paragraph = None
+        self.table = None
+        self.cphs = [ None ] * len(self.cphs)
+        self.tfs = [ (None, True) ] * len(self.tfs)
+
+    def add_image(self, src, info, left, top, width, height):
+        # like shapes.add_picture, but takes the image size from info and
+        # only reads the image if it is not in the presentation yet
+        self._ensure_slide()
+        width, height = scale_size(info, width, height)
+        image_part = self.get_image_part(src, info, width, height)
+        rId = self.slide.part.relate_to(image_part, RT.IMAGE)
+        shapes = self.slide.shapes
+        pic = shapes._add_pic_from_image_part(image_part, rId, left, top, width, height)
+        return shapes._shape_factory(pic)
+
+    def get_image_part(self, src, info, width, height):
+        # the image part for src shown at width x height, resampled if
+        # needed
+        blob = None
+        if self.resampler is not None:
+            blob = self.resampler.process(src, info, width, height)
+        if blob is not None:
+            return self.get_or_add_image_part(PPTXImage(blob, os.path.basename(src)))
+        image_part = self.image_parts_by_sha1().get(info.sha1)
+        if image_part is None and self.spill is not None and info.format in IMAGE_EXTENSIONS:
+            # read the image from src when the presentation is saved
+            partname = self.next_image_partname(IMAGE_EXTENSIONS[info.format])
+            image_part = FileImagePart(partname, image_content_types[partname.ext],
+                    self.prs.part.package, src, os.path.basename(src))
+            self.image_parts[info.sha1] = image_part
+        if image_part is None:
+            with open(src, 'rb') as f:
+                image = PPTXImage(f.read(), os.path.basename(src))
+            image_part = self.add_image_part(image, info.sha1)
+        return image_part
+
+    def get_or_add_image_part(self, image):
+        image_part = self.image_parts_by_sha1().get(image.sha1)
+        if image_part is None:
+            image_part = self.add_image_part(image, image.sha1)
+        return image_part
+
+    def add_image_part(self, image, sha1):
+        # python-pptx finds existing image parts and free part names by
+        # walking all relationships in the package for every image, so
+        # keep track of them here
+        partname = self.next_image_partname(image.ext)
+        if self.spill is not None:
+            image_part = self.spill.image_part(partname, image.content_type,
+                    self.prs.part.package, image.blob, image.filename)
+        else:
+            image_part = ImagePart(partname, image.content_type, self.prs.part.package,
+                    image.blob, image.filename)
+        self.image_parts[sha1] = image_part
+        return image_part
+
+    def next_image_partname(self, ext):
+        self.image_parts_by_sha1()
+        idx = 1
+        while idx in self.image_idxs:
+            idx += 1
+        self.image_idxs.add(idx)
+        return PackURI('/ppt/media/image%d.%s' % (idx, ext))
+
+    def image_parts_by_sha1(self):
+        if self.image_parts is None:
+            self.image_parts = {}
+            self.image_idxs = set()
+            for part in self.prs.part.package.iter_parts():
+                if part.partname.startswith('/ppt/media/image') and part.partname.idx is not None:
+                    self.image_idxs.add(part.partname.idx)
+                if isinstance(part, ImagePart):
+                    self.image_parts[part.sha1] = part
+        return self.image_parts
+
+    def stack_depth(self):
+        return len(self.cphs)
+
+    def drop_slides(self, first, depth):
+        # Drops all slides from position first onwards and puts the stacks
+        # back to depth. A table that continues on more slides pushes only
+        # one frame, so the slides cannot be counted for that.
+        while self.slide_count() > first:
+            self.drop_slide()
+        self.truncate_stacks(depth)
+
+    def truncate_stacks(self, depth):
+        del self.cphs[depth:]
+        del self.tfs[depth:]
+        del self.tlys[depth:]
+
     def set_slide_layout(self, layout_name):
+        if self.pending_slide is not None:
+            self.get_layout_by_name(layout_name)
+            self.pending_slide['layout'] = layout_name
+            return
+        # the slide has content already, build it again
         title = self.slide.shapes.title.text
         tly = self.tly()
+        idx = self.slide_idx
         self.drop_slide()
+        self.truncate_stacks(idx)
         self.add_slide(layout=layout_name, title=title)
 
     def set_slide_background(self, img_path, **options):
-        dim = (0, 0, None, None)
-        dim = self.update_box_dimensions(dim,
-                self.make_length_from_options(options, 'left'),
-                self.make_length_from_options(options, 'top'),
-                self.make_length_from_options(options, 'width'),
-                self.make_length_from_options(options, 'height'))
+        if self.pending_slide is not None and self.shared_backgrounds \
+                and self.pending_slide.get('background') is None:
+            self.pending_slide['background'] = (img_path, options)
+        elif self.pending_slide is not None:
+            self.pending_slide['operations'].append((self._set_slide_background, (img_path, options)))
+        else:
+            self._set_slide_background(img_path, options)
 
-        img = self.slide.shapes.add_picture(img_path, *dim)
+    def _set_slide_background(self, img_path, options):
+        dim = self.get_background_dimensions(options)
+        img = self.add_image(img_path, image_infos.get(img_path), *dim)
 
         # This moves it to the background
         # self.slide.shapes._spTree.remove(img._element)
@@ -278,6 +744,65 @@ class PPTXPresentation:
         cursor_sp = self.slide.shapes[0]._element
         cursor_sp.addprevious(img._element)
 
+    def get_background_dimensions(self, options):
+        dim = (0, 0, None, None)
+        return self.update_box_dimensions(dim,
+                self.make_length_from_options(options, 'left'),
+                self.make_length_from_options(options, 'top'),
+                self.make_length_from_options(options, 'width'),
+                self.make_length_from_options(options, 'height'))
+
+    def get_background_image(self, img_path, options):
+        # the image part and the dimensions of a shared background
+        left, top, width, height = self.get_background_dimensions(options)
+        info = image_infos.get(img_path)
+        width, height = scale_size(info, width, height)
+        return self.get_image_part(img_path, info, width, height), (left, top, width, height)
+
+    def get_background_layout(self, layout_name, image_part, dim):
+        # Returns the name of a copy of the layout with the background image
+        # behind its placeholders. There is one copy for each layout, image
+        # and position, which all slides with that background share.
+        key = (layout_name, image_part.sha1, tuple(dim))
+        name = self.background_layouts.get(key)
+        if name is not None:
+            return name
+        name = "%s, background %d" % (layout_name, len(self.background_layouts) + 1)
+        layout = self.add_layout_copy(self.get_layout_by_name(layout_name), name)
+        rId = layout.part.relate_to(image_part, RT.IMAGE)
+        spTree = layout.shapes._spTree
+        first_sp = next(spTree.iter_shape_elms(), None)
+        pic = spTree.add_pic(spTree.max_shape_id + 1, 'Background', '', rId, *dim)
+        if first_sp is not None:
+            first_sp.addprevious(pic)
+        self.background_layouts[key] = name
+        self.generated_layouts[name] = (layout_name, image_part, tuple(dim))
+        self.layouts[name] = (layout, self.layouts[layout_name][1])
+        return name
+
+    def add_layout_copy(self, layout, name):
+        # adds a copy of layout to the slide master of layout
+        package = self.prs.part.package
+        partname = package.next_partname('/ppt/slideLayouts/slideLayout%d.xml')
+        element = copy.deepcopy(layout.part._element)
+        element.cSld.set('name', name)
+        part = SlideLayoutPart(partname, CT.PML_SLIDE_LAYOUT, package, element)
+        rIds = {}
+        for rId, rel in layout.part.rels.items():
+            if rel.is_external:
+                rIds[rId] = part.rels.get_or_add_ext_rel(rel.reltype, rel.target_ref)
+            else:
+                rIds[rId] = part.rels.get_or_add(rel.reltype, rel.target_part)
+        rename_rIds(element, rIds)
+        master = layout.slide_master
+        ids = [ int(e.get('id')) for e in self.prs.part._element.sldMasterIdLst ]
+        for m in self.prs.slide_masters:
+            ids.extend(int(e.get('id')) for e in m._element.get_or_add_sldLayoutIdLst())
+        sldLayoutId = master._element.get_or_add_sldLayoutIdLst()._add_sldLayoutId()
+        sldLayoutId.set('id', str(max(ids) + 1))
+        sldLayoutId.rId = master.part.relate_to(part, RT.SLIDE_LAYOUT)
+        return part.slide_layout
+
     def has_content_placeholder(self):
         return self.cph() is not None
 
@@ -291,10 +816,10 @@ class PPTXPresentation:
         self.tlys[-1].update(options)
 
     def get_layout_by_name(self, name):
-        layouts = [ l for l in self.prs.slide_layouts if l.name == name ]
-        if layouts != []:
-            return layouts[0]
-        return None
+        try:
+            return self.layouts[name][0]
+        except KeyError:
+            raise ValueError("unknown layout %r, the layouts are %s" % (name, ", ".join(self.layouts)))
 
     def get_default_text_layout(self):
         return {
@@ -327,6 +852,12 @@ class PPTXPresentation:
         # BODY=2, OBJECT=7
 
     def set_title_box(self, options):
+        if self.pending_slide is not None:
+            self.pending_slide['operations'].append((self._set_title_box, (options,)))
+        else:
+            self._set_title_box(options)
+
+    def _set_title_box(self, options):
         title_box = self.slide.shapes.title
         dim = self.get_box_dimensions_from_shape(title_box)
         dim = self.update_box_dimensions(dim,
@@ -386,9 +917,13 @@ class PPTXPresentation:
         self.tfs.pop()
 
     def cph(self):
+        if self.pending_slide is not None:
+            self._ensure_slide()
         return self.cphs[-1]
 
     def tf(self):
+        if self.pending_slide is not None:
+            self._ensure_slide()
         return self.tfs[-1]
 
     def tly(self):
@@ -0,0 +1,128 @@
+import sys
+import json
+import time
+import functools
+
+# PPTXPresentation operations that are timed when profiling
+PRESENTATION_OPERATIONS = [
+    'add_slide', 'add_paragraph', 'add_text', 'add_runs', 'add_picture',
+    'add_image', 'add_table', 'start_box', 'set_slide_background',
+    'set_title_box', '_ensure_slide', 'export_slides', 'import_slides', 'save',
+]
+
+
+class Profiler:
+    """Collects build timings: phase totals (parse, render, save), time per
+    handler type and presentation operation, in total and per slide.
+    Handler and operation times include the time of nested calls."""
+
+    def __init__(self):
+        self.phases = {}
+        self.handlers = {}
+        self.operations = {}
+        self.slides = []
+        self.slide = None
+        self.depth = 0
+        self._phase_stack = []
+
+    def phase(self, name):
+        return _Phase(self, name)
+
+    def start_slide(self, title):
+        # slides are numbered in the order they are rendered, slides taken
+        # from the slide cache are not rendered
+        self.slide = { 'number': len(self.slides) + 1, 'title': title,
+                'time': 0.0, 'handlers': {} }
+        self.slides.append(self.slide)
+
+    def add_time(self, table, name, seconds):
+        entry = table.get(name)
+        if entry is None:
+            entry = table[name] = [0, 0.0]
+        entry[0] += 1
+        entry[1] += seconds
+
+    def feed(self, feed_one, e):
+        # times one element of PPTXWriter.feed
+        if e['type'] == 'heading' and e['level'] <= 2:
+            self.start_slide(e['children'][0].get('text', ''))
+        start = time.perf_counter()
+        self.depth += 1
+        try:
+            feed_one(e)
+        finally:
+            self.depth -= 1
+            seconds = time.perf_counter() - start
+            self.add_time(self.handlers, e['type'], seconds)
+            if self.slide is not None:
+                self.add_time(self.slide['handlers'], e['type'], seconds)
+                if self.depth == 0:
+                    self.slide['time'] += seconds
+
+    def instrument(self, obj, names):
+        # replaces the methods of obj by timed versions, on this instance only
+        for name in names:
+            setattr(obj, name, self.timed(name, getattr(obj, name)))
+
+    def timed(self, name, f):
+        @functools.wraps(f)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return f(*args, **kwargs)
+            finally:
+                self.add_time(self.operations, name, time.perf_counter() - start)
+        return wrapper
+
+    def to_json(self, slowest=10):
+        def table(t):
+            return { name: { 'count': count, 'seconds': seconds }
+                for name, (count, seconds) in t.items() }
+        slides = [ dict(s, handlers=table(s['handlers'])) for s in self.slides ]
+        return {
+            'phases': self.phases,
+            'handlers': table(self.handlers),
+            'operations': table(self.operations),
+            'slides': slides,
+            'slowest slides': sorted(slides, key=lambda s: s['time'], reverse=True)[:slowest],
+        }
+
+    def write_json(self, fn):
+        with open(fn, 'w') as f:
+            json.dump(self.to_json(), f, indent=2)
+
+    def report(self, out=sys.stderr, slowest=10):
+        data = self.to_json(slowest)
+        print("phases:", file=out)
+        for name, seconds in data['phases'].items():
+            print("  %-24s %9.3fs" % (name, seconds), file=out)
+        for title in ['handlers', 'operations']:
+            print("%s (inclusive):" % title, file=out)
+            entries = sorted(data[title].items(), key=lambda x: x[1]['seconds'], reverse=True)
+            for name, entry in entries:
+                print("  %-24s %9.3fs %8d calls" % (name, entry['seconds'], entry['count']), file=out)
+        print("slowest slides:", file=out)
+        for s in data['slowest slides']:
+            print("  %4d %9.3fs  %s" % (s['number'], s['time'], s['title']), file=out)
+
+
+class _Phase:
+    # Times a build phase. Time spent in nested phases is only counted for
+    # the nested phase, e.g. parsing while streaming is not render time.
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        self.nested = 0.0
+        self.profiler._phase_stack.append(self)
+
+    def __exit__(self, *exc):
+        profiler = self.profiler
+        profiler._phase_stack.pop()
+        seconds = time.perf_counter() - self.start
+        if profiler._phase_stack:
+            profiler._phase_stack[-1].nested += seconds
+        profiler.phases[self.name] = profiler.phases.get(self.name, 0.0) + seconds - self.nested
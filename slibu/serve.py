@@ -0,0 +1,254 @@
+import io
+import sys
+import signal
+import json
+import time
+import threading
+import collections
+import concurrent.futures
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+from . import batch
+from .pptx_writer import CODE_STYLE
+
+# An HTTP server that renders Markdown with a pool of worker processes.
+# Every worker loads the templates, the Markdown parser and the Pygments
+# lexers when it starts, so a request only pays for rendering.
+#
+#   POST /render?template=NAME   Markdown in the body, returns the pptx
+#   GET  /metrics                queue depth, latencies and cache hit rates
+
+PPTX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.presentationml.presentation'
+
+# lexers to load in every worker
+LEXERS = [ 'python', 'c', 'java', 'javascript', 'sh', 'json', 'yaml', 'sql' ]
+
+# number of latencies kept for the percentiles
+LATENCY_WINDOW = 1000
+
+
+def _init_worker(cache_dir, options, save_options, templates, lexers):
+    batch._init_worker(cache_dir, options, save_options)
+    for template in templates:
+        batch.get_builder(template)
+    from .highlighting import highlight_runs
+    for name in lexers:
+        highlight_runs(name, 'x\n', CODE_STYLE)
+
+def _warm_up():
+    return None
+
+class RenderTimeout(Exception):
+    pass
+
+def _timeout(signum, frame):
+    raise RenderTimeout("render took too long")
+
+def _render(markdown, template, timeout=None):
+    # Returns the pptx, the render time and the cache counters of this job.
+    # A render that takes longer than timeout seconds is stopped, so that
+    # it does not keep the worker from the next jobs.
+    builder = batch.get_builder(template)
+    counters = cache_counters(builder)
+    start = time.perf_counter()
+    out = io.BytesIO()
+    if timeout is not None:
+        signal.signal(signal.SIGALRM, _timeout)
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        builder.build(markdown, out)
+    finally:
+        if timeout is not None:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+    seconds = time.perf_counter() - start
+    after = cache_counters(builder)
+    return out.getvalue(), seconds, { k: after[k] - counters[k] for k in after }
+
+def cache_counters(builder):
+    counters = { 'slide cache hits': 0, 'slide cache misses': 0 }
+    code_cache = builder.options.get('code_cache')
+    if code_cache is not None:
+        counters['code cache hits'] = code_cache.hits
+        counters['code cache misses'] = code_cache.misses
+    if builder.cache is not None:
+        counters['slide cache hits'] = builder.cache.hits
+        counters['slide cache misses'] = builder.cache.misses
+    return counters
+
+
+class RenderServer:
+    """Accepts render requests and hands them to the worker pool. At most
+    workers + queue_size requests are in progress; more requests are
+    refused with 503."""
+
+    def __init__(self, templates, workers=1, queue_size=16, timeout=60,
+            cache_dir=None, options=None, save_options=None, lexers=LEXERS):
+        # templates maps template names in requests to paths, the first one
+        # is the default
+        self.templates = templates
+        self.default_template = next(iter(templates))
+        self.workers = workers
+        self.timeout = timeout
+        self.slots = threading.BoundedSemaphore(workers + queue_size)
+        self.lock = threading.Lock()
+        self.in_progress = 0
+        self.counts = collections.Counter()
+        self.cache_counts = collections.Counter()
+        self.latencies = collections.deque(maxlen=LATENCY_WINDOW)
+        self.render_times = collections.deque(maxlen=LATENCY_WINDOW)
+        self.initargs = (cache_dir, options or {}, save_options or {},
+                list(templates.values()), lexers)
+        self.pool = self.start_pool()
+        # start all workers now instead of on the first requests
+        for f in [ self.pool.submit(_warm_up) for i in range(workers) ]:
+            f.result()
+
+    def start_pool(self):
+        return ProcessPoolExecutor(self.workers, initializer=_init_worker, initargs=self.initargs)
+
+    def restart_pool(self, pool):
+        # replaces pool if a worker died, unless another request did already
+        with self.lock:
+            if self.pool is not pool:
+                return
+            self.pool = self.start_pool()
+            self.counts['pool restarts'] += 1
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def submit(self, markdown, path):
+        # returns the pool and the future of the job
+        pool = self.pool
+        try:
+            return pool, pool.submit(_render, markdown, path, self.timeout)
+        except BrokenProcessPool:
+            self.restart_pool(pool)
+        pool = self.pool
+        return pool, pool.submit(_render, markdown, path, self.timeout)
+
+    def render(self, markdown, template=None):
+        # Returns (status, body). The slot of a request is only given back
+        # when its worker is done, also if the request timed out.
+        if template is None:
+            template = self.default_template
+        path = self.templates.get(template)
+        if path is None:
+            return 404, ("unknown template %s\n" % template).encode()
+        if not self.slots.acquire(blocking=False):
+            self.count('rejected')
+            return 503, b"too many requests\n"
+        with self.lock:
+            self.in_progress += 1
+        start = time.perf_counter()
+        try:
+            pool, future = self.submit(markdown, path)
+        except Exception as e:
+            self.done(None)
+            self.count('errors')
+            return 503, ("cannot start render: %s\n" % e).encode()
+        future.add_done_callback(self.done)
+        try:
+            pptx, seconds, counters = future.result(self.timeout)
+        except (concurrent.futures.TimeoutError, RenderTimeout):
+            self.count('timeouts')
+            return 504, b"timeout\n"
+        except BrokenProcessPool as e:
+            # a worker died, e.g. killed for using too much memory
+            self.restart_pool(pool)
+            self.count('errors')
+            return 500, ("error: %s\n" % e).encode()
+        except Exception as e:
+            self.count('errors')
+            return 500, ("error: %s\n" % e).encode()
+        with self.lock:
+            self.counts['rendered'] += 1
+            self.cache_counts.update(counters)
+            self.latencies.append(time.perf_counter() - start)
+            self.render_times.append(seconds)
+        return 200, pptx
+
+    def done(self, future):
+        with self.lock:
+            self.in_progress -= 1
+        self.slots.release()
+
+    def count(self, name):
+        with self.lock:
+            self.counts[name] += 1
+
+    def metrics(self):
+        with self.lock:
+            metrics = {
+                'workers': self.workers,
+                'in progress': self.in_progress,
+                'queue depth': max(0, self.in_progress - self.workers),
+                'requests': dict(self.counts),
+                'latency': percentiles(self.latencies),
+                'render time': percentiles(self.render_times),
+            }
+            for cache in ['slide cache', 'code cache']:
+                hits = self.cache_counts[cache + ' hits']
+                misses = self.cache_counts[cache + ' misses']
+                metrics[cache + ' hit rate'] = hits / (hits + misses) if hits + misses else None
+        return metrics
+
+    def close(self):
+        self.pool.shutdown(cancel_futures=True)
+
+
+def percentiles(values):
+    values = sorted(values)
+    if values == []:
+        return {}
+    def p(q):
+        return values[min(len(values) - 1, int(q * len(values)))]
+    return { 'p50': p(0.50), 'p90': p(0.90), 'p99': p(0.99), 'max': values[-1] }
+
+
+class RenderRequestHandler(BaseHTTPRequestHandler):
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path != '/render':
+            self.send(404, b"not found\n")
+            return
+        length = int(self.headers.get('Content-Length', 0))
+        markdown = self.rfile.read(length).decode('utf-8')
+        template = parse_qs(url.query).get('template', [None])[0]
+        status, body = self.server.renderer.render(markdown, template)
+        if status == 200:
+            self.send(status, body, PPTX_CONTENT_TYPE)
+        else:
+            self.send(status, body)
+
+    def do_GET(self):
+        if urlparse(self.path).path != '/metrics':
+            self.send(404, b"not found\n")
+            return
+        body = json.dumps(self.server.renderer.metrics(), indent=2).encode() + b"\n"
+        self.send(200, body, 'application/json')
+
+    def send(self, status, body, content_type='text/plain; charset=utf-8'):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        if status == 503:
+            self.send_header('Retry-After', '1')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        sys.stderr.write("%s\n" % (format % args))
+
+
+def serve(renderer, host='127.0.0.1', port=8000):
+    server = ThreadingHTTPServer((host, port), RenderRequestHandler)
+    server.daemon_threads = True
+    server.renderer = renderer
+    print("serving on http://%s:%d/" % (host, server.server_port), file=sys.stderr)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        renderer.close()
@@ -0,0 +1,173 @@
+import os
+import json
+import hashlib
+from .chunking import collect_media, collect_data_files
+from .template import Template
+from .image_info import image_infos
+from .cache_util import LRUCache, write_atomic, file_digest
+
+# bump this when a change in slibu changes the rendered slide XML
+CACHE_VERSION = 2
+
+# writer options that do not change the rendered slides
+IGNORED_OPTIONS = [ 'spill_dir' ]
+
+# bytes of slides kept in memory when there is no cache directory
+MEMORY_LIMIT = 256 << 20
+
+
+def slides_size(slides):
+    # slide XML and image bytes; images shared between slides are counted
+    # for every slide
+    size = 0
+    for s in slides:
+        size += len(s['xml']) + sum(len(blob) for rId, blob, filename in s['images'])
+        if s.get('background') is not None:
+            size += len(s['background'][0])
+    return size
+
+
+class SlideCache:
+    """Stores rendered slides, keyed on the hash of the AST chunk that
+    produced them, the template and the media the chunk refers to.
+
+    If cache_dir is given, entries are stored on disk only, so that they
+    can be reused by later builds. Otherwise the most recently used entries
+    are kept in memory.
+    """
+
+    def __init__(self, cache_dir=None, template=None, options=None):
+        self.cache_dir = cache_dir
+        # writer options that change the rendered slides
+        self.options = repr(sorted((k, v) for k, v in (options or {}).items() if k not in IGNORED_OPTIONS))
+        self.entries = LRUCache(MEMORY_LIMIT, slides_size)
+        # path -> (mtime, size, digest) of data files
+        self.data_digests = {}
+        self.hits = 0
+        self.misses = 0
+        if isinstance(template, Template):
+            self.template_digest = template.digest
+        elif isinstance(template, str):
+            self.template_digest = file_digest(template)
+        else:
+            self.template_digest = None
+        if cache_dir is not None:
+            os.makedirs(os.path.join(cache_dir, 'media'), exist_ok=True)
+            image_infos.load(self._image_infos_path())
+
+    def key(self, chunk):
+        h = hashlib.sha1()
+        h.update(str(CACHE_VERSION).encode())
+        h.update(str(self.template_digest).encode())
+        h.update(self.options.encode())
+        h.update(json.dumps(chunk, sort_keys=True, default=repr).encode())
+        for src in collect_media(chunk):
+            h.update(src.encode())
+            h.update(self.media_digest(src).encode())
+        for src in collect_data_files(chunk):
+            h.update(src.encode())
+            h.update(self.data_digest(src).encode())
+        return h.hexdigest()
+
+    def media_digest(self, src):
+        try:
+            return image_infos.get(src).sha1
+        except OSError:
+            return 'missing'
+
+    def data_digest(self, src):
+        try:
+            st = os.stat(src)
+        except OSError:
+            return 'missing'
+        entry = self.data_digests.get(src)
+        if entry is None or entry[:2] != (st.st_mtime_ns, st.st_size):
+            entry = self.data_digests[src] = (st.st_mtime_ns, st.st_size, file_digest(src))
+        return entry[2]
+
+    def save(self):
+        # entries are written when they are added, only the image
+        # metadata needs to be stored
+        if self.cache_dir is not None:
+            image_infos.save(self._image_infos_path())
+
+    def _image_infos_path(self):
+        return os.path.join(self.cache_dir, 'images.json')
+
+    def get(self, key):
+        if self.cache_dir is not None:
+            slides = self._load(key)
+        else:
+            slides = self.entries.get(key)
+        if slides is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return slides
+
+    def put(self, key, slides):
+        # slides is None if the rendered slides can not be cached
+        if slides is None:
+            return
+        if self.cache_dir is not None:
+            self._store(key, slides)
+        else:
+            self.entries.put(key, slides)
+
+    def _entry_path(self, key):
+        return os.path.join(self.cache_dir, key + '.json')
+
+    def _media_path(self, digest):
+        return os.path.join(self.cache_dir, 'media', digest)
+
+    def _load(self, key):
+        try:
+            with open(self._entry_path(key)) as f:
+                entry = json.load(f)
+            slides = []
+            for s in entry:
+                images = []
+                for rId, digest, filename in s['images']:
+                    with open(self._media_path(digest), 'rb') as f:
+                        images.append((rId, f.read(), filename))
+                background = s.get('background')
+                if background is not None:
+                    digest, filename, dim = background
+                    with open(self._media_path(digest), 'rb') as f:
+                        background = (f.read(), filename, dim)
+                slides.append({
+                    'layout': s['layout'],
+                    'xml': s['xml'].encode('utf-8'),
+                    'layout_rId': s['layout_rId'],
+                    'images': images,
+                    'background': background,
+                })
+            return slides
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def _store(self, key, slides):
+        entry = []
+        for s in slides:
+            images = []
+            for rId, blob, filename in s['images']:
+                images.append((rId, self._store_media(blob), filename))
+            background = s.get('background')
+            if background is not None:
+                blob, filename, dim = background
+                background = (self._store_media(blob), filename, dim)
+            entry.append({
+                'layout': s['layout'],
+                'xml': s['xml'].decode('utf-8'),
+                'layout_rId': s['layout_rId'],
+                'images': images,
+                'background': background,
+            })
+        write_atomic(self._entry_path(key), json.dumps(entry).encode('utf-8'))
+
+    def _store_media(self, blob):
+        digest = hashlib.sha1(blob).hexdigest()
+        path = self._media_path(digest)
+        if not os.path.exists(path):
+            write_atomic(path, blob)
+        return digest
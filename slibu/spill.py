@@ -0,0 +1,71 @@
+import os
+import tempfile
+from pptx.opc.package import Part
+from pptx.parts.image import ImagePart
+
+# Keeps finished slides and images in files instead of in memory, for decks
+# that do not fit in memory. The parts read their file again when the
+# package is saved, one part at a time.
+
+# same as pptx.parts.image.Image.ext
+IMAGE_EXTENSIONS = {
+    'BMP': 'bmp', 'GIF': 'gif', 'JPEG': 'jpg', 'PNG': 'png', 'TIFF': 'tiff', 'WMF': 'wmf',
+}
+
+
+class FileImagePart(ImagePart):
+    """An image part that reads its image from path when it is needed."""
+
+    def __init__(self, partname, content_type, package, path, filename=None):
+        self.path = path
+        ImagePart.__init__(self, partname, content_type, package, None, filename)
+
+    @property
+    def _blob(self):
+        with open(self.path, 'rb') as f:
+            return f.read()
+
+    @_blob.setter
+    def _blob(self, blob):
+        # the image is in the file
+        pass
+
+
+class SpilledSlidePart(Part):
+    """A finished slide part, written to path. It keeps the relationships
+    of the slide, so the rest of the package does not notice the swap."""
+
+    def __init__(self, partname, content_type, package, path, rels):
+        Part.__init__(self, partname, content_type, package)
+        self.path = path
+        # _rels is a lazyproperty, that can only be set like this
+        self.__dict__['_rels'] = rels
+
+    @property
+    def blob(self):
+        with open(self.path, 'rb') as f:
+            return f.read()
+
+
+class SpillStore:
+    """A temporary directory in spill_dir for the parts of one presentation.
+    It is removed with the store."""
+
+    def __init__(self, spill_dir=None):
+        if spill_dir is not None:
+            os.makedirs(spill_dir, exist_ok=True)
+        self.tmp = tempfile.TemporaryDirectory(prefix='slibu-', dir=spill_dir)
+
+    def write(self, name, blob):
+        path = os.path.join(self.tmp.name, name)
+        with open(path, 'wb') as f:
+            f.write(blob)
+        return path
+
+    def spill_slide(self, part):
+        path = self.write('slide%d.xml' % part.partname.idx, part.blob)
+        return SpilledSlidePart(part.partname, part.content_type, part.package, path, part.rels)
+
+    def image_part(self, partname, content_type, package, blob, filename):
+        path = self.write(os.path.basename(partname), blob)
+        return FileImagePart(partname, content_type, package, path, filename)
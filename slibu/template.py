@@ -0,0 +1,59 @@
+import io
+import os
+import copy
+import hashlib
+import threading
+from pptx import Presentation
+
+
+class Template:
+    """A pptx template that is read once and kept in memory, so that it can
+    be opened for many builds without going to the disk again. The template
+    is parsed on the first open; later opens return a copy of it, so it can
+    be shared between threads. blob gives the pptx data instead of reading
+    it from path."""
+
+    def __init__(self, path=None, blob=None):
+        self.path = path
+        self.mtime = None
+        if blob is None:
+            self.mtime = os.stat(path).st_mtime_ns
+            with open(path, 'rb') as f:
+                blob = f.read()
+        self.blob = blob
+        self.digest = hashlib.sha1(self.blob).hexdigest()
+        self.prs = None
+        self.lock = threading.Lock()
+
+    def __getstate__(self):
+        # send only the pptx data to worker processes
+        state = self.__dict__.copy()
+        state['prs'] = None
+        del state['lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+
+    def open(self):
+        with self.lock:
+            if self.prs is None:
+                self.prs = Presentation(io.BytesIO(self.blob))
+            return copy.deepcopy(self.prs)
+
+    def is_changed(self):
+        # True if the file at path is not the one that was read
+        if self.path is None:
+            return False
+        try:
+            return os.stat(self.path).st_mtime_ns != self.mtime
+        except OSError:
+            return True
+
+
+def open_template(template):
+    # template is a Template, or anything that python-pptx can open
+    if isinstance(template, Template):
+        return template.open()
+    return Presentation(template)
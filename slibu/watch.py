@@ -0,0 +1,47 @@
+import os
+import sys
+import time
+from .chunking import collect_media, collect_data_files
+from .slide_cache import SlideCache
+from .template import Template
+
+
+def get_mtimes(paths):
+    mtimes = {}
+    for p in paths:
+        try:
+            mtimes[p] = os.stat(p).st_mtime_ns
+        except OSError:
+            mtimes[p] = None
+    return mtimes
+
+
+def watch(builder, source, out_file, interval=0.2):
+    # Rebuilds out_file whenever source, the template or one of the media
+    # or data files that source refers to changes. Runs until interrupted.
+    template_path = builder.template.path
+    watched = [source, template_path]
+    mtimes = {}
+    while True:
+        current = get_mtimes(watched)
+        if current != mtimes:
+            mtimes = current
+            start = time.time()
+            try:
+                # the template can be missing for a moment while it is saved
+                if mtimes[template_path] != builder.template.mtime:
+                    reload_template(builder)
+                with open(source) as f:
+                    ast = builder.build(f.read(), out_file)
+                media = sorted(set(collect_media(ast) + collect_data_files(ast)))
+                watched = [source, template_path] + media
+                mtimes.update(get_mtimes(media))
+                print("built", out_file, "in %.2fs" % (time.time() - start), file=sys.stderr)
+            except Exception as e:
+                print("ERROR:", e, file=sys.stderr)
+        time.sleep(interval)
+
+def reload_template(builder):
+    builder.template = Template(builder.template.path)
+    if builder.cache is not None:
+        builder.cache = SlideCache(builder.cache.cache_dir, builder.template, builder.options)